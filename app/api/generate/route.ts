@@ -3,6 +3,14 @@ import { type NextRequest, NextResponse } from "next/server"
 // CORREÇÃO: Adicionada uma barra (/) no final da URL
 const FASTAPI_BACKEND_URL = "http://localhost:8000/api/v1/generate/";
 
+// Endereço real do utilizador: o que a plataforma determina (request.ip) ou um cabeçalho que o proxy de
+// entrada reescreve sempre (CLIENT_IP_HEADER, ex.: "x-real-ip"). Nunca o X-Forwarded-For recebido, que o
+// próprio cliente pode escrever.
+function clientAddress(request: NextRequest): string | undefined {
+  const header = process.env.CLIENT_IP_HEADER;
+  return request.ip ?? (header ? request.headers.get(header)?.trim() || undefined : undefined);
+}
+
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
@@ -17,11 +25,19 @@ export async function POST(request: NextRequest) {
 
     console.log("Encaminhando para o FastAPI o corpo completo:", JSON.stringify(body));
     
+    // Identifica o utilizador final junto do backend (limites por cliente): acrescenta o endereço real ao
+    // X-Forwarded-For, como qualquer proxy, e o backend usa a entrada mais à direita. Sem endereço conhecido,
+    // não envia o cabeçalho e o backend conta o pedido como vindo deste servidor.
+    const address = clientAddress(request);
+    const incoming = request.headers.get("x-forwarded-for");
+    const forwardedFor = address ? (incoming ? `${incoming}, ${address}` : address) : null;
+
     const fastapiResponse = await fetch(FASTAPI_BACKEND_URL, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
         "Accept": "application/json",
+        ...(forwardedFor ? { "X-Forwarded-For": forwardedFor } : {}),
       },
       body: JSON.stringify(body),
     });
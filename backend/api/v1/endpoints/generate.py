@@ -1,72 +1,103 @@
 # File: backend/api/v1/endpoints/generate.py
+import asyncio
+import base64
 import json
-from fastapi import APIRouter, HTTPException, Body
-from models.generate import GenerateRequest, GenerateResponse
-from core.prompt_composer import load_preset, apply_modifiers_and_influence
-from core.translator import translate_prompt_intelligently
-from core.image_generator import generate_image_from_json
-from openai import AsyncOpenAI
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Body, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from models.generate import BatchGenerateRequest, BatchVariantResponse, GenerateRequest, GenerateResponse, JobResponse
+from core.moderation import PromptFlaggedError
+from core.pipeline import run_generation_pipeline
+from core.clients import ClientManager
+from core.deadline import ClientDisconnected, DeadlineExceeded, deadline_scope, resolve_deadline, run_until_disconnected, within_deadline
+from core.blob_store import blob_store
+from core.jobs import Job, TERMINAL_STATUSES, job_manager
+from core.batch import prepare_batch, build_variants, generate_variants
+from core.metrics import span
+from core.vectorizer import vectorize_image_data, wants_vectorization
+
+logger = logging.getLogger(__name__)
+
+# Intervalo dos comentários de keep-alive no stream SSE, para proxies não fecharem a ligação.
+SSE_KEEPALIVE_SECONDS = 15
+# Intervalo entre verificações de que o cliente ainda está ligado, durante a geração síncrona.
+DISCONNECT_POLL_SECONDS = 0.5
+# Código não padrão (nginx) para pedidos abandonados pelo cliente; só aparece nas métricas e nos logs.
+CLIENT_CLOSED_REQUEST = 499
 
 router = APIRouter()
 
-# Inicializa o cliente da OpenAI.
-# Ele irá ler a chave de API da variável de ambiente OPENAI_API_KEY.
-try:
-    client = AsyncOpenAI()
-except Exception as e:
-    print(f"AVISO: Não foi possível inicializar o cliente OpenAI. A moderação de segurança estará desativada. Erro: {e}")
-    client = None
+def get_clients(http_request: Request) -> ClientManager:
+    """Injeta o gestor de clientes partilhados criado no lifespan da aplicação."""
+    return http_request.app.state.clients
+
+async def build_svg(blob: dict, request: GenerateRequest) -> Optional[str]:
+    """Vetoriza a imagem gerada quando pedido; uma falha aqui não invalida a imagem já gerada."""
+    if not wants_vectorization(request.creative_mode, request.context, request.vectorize):
+        return None
+    try:
+        with span("vectorize"):
+            image_bytes = await asyncio.to_thread(blob_store.read_bytes, blob["hash"])
+            # Com o prazo esgotado, a resposta segue sem o SVG em vez de falhar.
+            return await within_deadline("vectorize", vectorize_image_data(image_bytes, request.vectorize_preset))
+    except Exception as e:
+        logger.warning("Erro ao vetorizar a imagem %s: %s", blob["hash"], e)
+        return None
+
+async def build_image_url(blob: dict, delivery: str, http_request: Request) -> str:
+    """Devolve o link curto para o blob ou, no modo legado 'inline', a data URL em base64."""
+    if delivery == "inline":
+        with span("encode"):
+            image_bytes = await asyncio.to_thread(blob_store.read_bytes, blob["hash"])
+            return f"data:{blob['content_type']};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+    return str(http_request.url_for("get_image", blob_hash=blob["hash"]))
 
 @router.post("/", response_model=GenerateResponse)
-async def handle_structured_generation(request: GenerateRequest = Body(...)):
+async def handle_structured_generation(http_request: Request, response: Response, request: GenerateRequest = Body(...), clients: ClientManager = Depends(get_clients)):
     """
     Orquestra todo o processo de geração de imagem, desde a validação de segurança
     até à chamada final do modelo de IA.
+    O pedido tem um prazo (o pedido pelo cliente, limitado pelo máximo da qualidade): ao esgotar-se,
+    devolve 504; se o cliente desligar antes, a geração e as chamadas ao upstream são canceladas.
     """
+    budget = resolve_deadline(request.deadline_seconds, request.quality)
     try:
-        # Camada 1: Moderação Proativa do Prompt do Utilizador
-        if client:
-            try:
-                mod_response = await client.moderations.create(input=request.user_prompt)
-                if mod_response.results[0].flagged:
-                    print(f"Prompt do utilizador bloqueado pela moderação: '{request.user_prompt}'")
-                    raise HTTPException(status_code=400, detail="O seu prompt viola as nossas políticas de conteúdo e segurança.")
-            except Exception as e:
-                # Se a API de moderação falhar, regista o erro mas continua o processo
-                # dependendo das outras camadas de segurança.
-                print(f"Erro na API de moderação da OpenAI: {e}. A prosseguir com as outras camadas de segurança.")
-
-        # Camada 2: Carregar o Template Base Granular
-        preset_json = load_preset(request.creative_mode, request.context)
-
-        # Camada 3: Aplicar Modificadores da UI e Injetar "Influência Secreta"
-        final_json = apply_modifiers_and_influence(
-            preset_json,
-            request.modifiers,
-            request.creative_mode,
-            request.context
-        )
-        
-        # Traduzir o prompt do utilizador de forma inteligente
-        translated_prompt = await translate_prompt_intelligently(request.user_prompt)
-        
-        # Inserir o prompt traduzido no campo 'description' do JSON
-        final_json["description"] = translated_prompt
-
-        # Camada 4: Gerar a imagem usando o prompt composto e o negative_prompt
-        generation_result = await generate_image_from_json(
-            prompt_data=final_json,
-            creative_mode=request.creative_mode,
-            quality=request.quality
-        )
-        
+        with deadline_scope(budget):
+            # Moderação, tradução e composição do preset correm em paralelo;
+            # a geração só começa depois de a moderação aprovar o prompt.
+            pipeline = await run_until_disconnected(
+                run_generation_pipeline(request, clients),
+                http_request.is_disconnected,
+                DISCONNECT_POLL_SECONDS,
+            )
+            svg = await build_svg(pipeline["result"]["images"][0], request)
+
+        final_json = pipeline["prompt"]
+        generation_result = pipeline["result"]
+        if generation_result.get("similarity") is not None:
+            response.headers["X-Cache"] = "SIMILAR"
+        else:
+            response.headers["X-Cache"] = "HIT" if generation_result.get("cached") else "MISS"
+
         # Retornar a resposta bem-sucedida para o frontend
         return GenerateResponse(
-            image_url=generation_result["images"][0]["url"],
+            image_url=await build_image_url(generation_result["images"][0], request.delivery, http_request),
+            thumbnail_url=await build_image_url(generation_result["thumbnail"], request.delivery, http_request),
             prompt_used=json.dumps(final_json, indent=2), # Retorna o JSON exato usado para depuração
-            seed=generation_result.get("seed")
+            seed=generation_result.get("seed"),
+            svg=svg,
+            similarity=generation_result.get("similarity")
         )
 
+    except PromptFlaggedError:
+        raise HTTPException(status_code=400, detail="O seu prompt viola as nossas políticas de conteúdo e segurança.")
+    except DeadlineExceeded as e:
+        logger.warning("Pedido de geração sem resposta dentro do prazo: %s", e, extra={"stage": e.stage, "budget": e.budget})
+        raise HTTPException(status_code=504, detail=f"A geração excedeu o tempo limite de {budget:g} segundos. Tente novamente ou escolha uma qualidade mais baixa.")
+    except ClientDisconnected:
+        logger.info("O cliente desligou antes do fim da geração; o trabalho em curso foi cancelado.")
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="O cliente fechou a ligação.")
     except FileNotFoundError as e:
         # Erro se um ficheiro de preset não for encontrado
         raise HTTPException(status_code=404, detail=f"Erro de configuração do servidor: {e}")
@@ -75,5 +106,113 @@ async def handle_structured_generation(request: GenerateRequest = Body(...)):
         raise e
     except Exception as e:
         # Captura qualquer outro erro inesperado durante o processo
-        print(f"Ocorreu um erro inesperado durante a geração: {e}")
-        raise HTTPException(status_code=500, detail="Não foi possível gerar a imagem. Tente novamente mais tarde.")
\ No newline at end of file
+        logger.exception("Ocorreu um erro inesperado durante a geração: %s", e)
+        raise HTTPException(status_code=500, detail="Não foi possível gerar a imagem. Tente novamente mais tarde.")
+
+async def build_job_response(job: Job, http_request: Request) -> JobResponse:
+    result = None
+    if job.status == "completed":
+        result = GenerateResponse(
+            image_url=await build_image_url(job.result["images"][0], job.request.delivery, http_request),
+            thumbnail_url=await build_image_url(job.result["thumbnail"], job.request.delivery, http_request),
+            prompt_used=json.dumps(job.prompt, indent=2),
+            seed=job.result.get("seed")
+        )
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        stage=job.stage,
+        result=result,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado.")
+    return job
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_generation_job(http_request: Request, response: Response, request: GenerateRequest = Body(...)):
+    """
+    Aceita o pedido e devolve imediatamente o id do job. A geração corre em segundo plano,
+    com concorrência limitada por fornecedor; o progresso pode ser seguido via SSE.
+    """
+    job = job_manager.submit(request)
+    response.headers["Location"] = str(http_request.url_for("get_generation_job", job_id=job.id))
+    return await build_job_response(job, http_request)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, name="get_generation_job")
+async def get_generation_job(job_id: str, http_request: Request):
+    """Devolve o estado atual do job e, se já terminou, o resultado ou o erro."""
+    return await build_job_response(get_job_or_404(job_id), http_request)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_generation_job_events(job_id: str):
+    """Stream Server-Sent Events com as transições de etapa do job, até ele terminar."""
+    job = get_job_or_404(job_id)
+
+    async def event_stream():
+        queue = job.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+                if event["status"] in TERMINAL_STATUSES:
+                    break
+        finally:
+            job.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/batch")
+async def handle_batch_generation(http_request: Request, request: BatchGenerateRequest = Body(...), clients: ClientManager = Depends(get_clients)):
+    """
+    Gera várias variantes do mesmo briefing. Moderação, preset e tradução correm uma única vez;
+    depois as gerações correm em paralelo (limitadas) e cada variante é enviada como uma linha
+    NDJSON assim que termina, sem esperar pela mais lenta.
+    """
+    budget = resolve_deadline(request.deadline_seconds, request.quality)
+    try:
+        with deadline_scope(budget):
+            prepared = await run_until_disconnected(prepare_batch(request, clients), http_request.is_disconnected, DISCONNECT_POLL_SECONDS)
+    except PromptFlaggedError:
+        raise HTTPException(status_code=400, detail="O seu prompt viola as nossas políticas de conteúdo e segurança.")
+    except DeadlineExceeded as e:
+        logger.warning("Preparação do lote sem resposta dentro do prazo: %s", e, extra={"stage": e.stage, "budget": e.budget})
+        raise HTTPException(status_code=504, detail=f"A preparação do lote excedeu o tempo limite de {budget:g} segundos. Tente novamente mais tarde.")
+    except ClientDisconnected:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="O cliente fechou a ligação.")
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Erro de configuração do servidor: {e}")
+    except Exception as e:
+        logger.exception("Ocorreu um erro inesperado durante a preparação do lote: %s", e)
+        raise HTTPException(status_code=500, detail="Não foi possível gerar a imagem. Tente novamente mais tarde.")
+
+    variants = build_variants(request, prepared)
+
+    async def variant_stream():
+        async for variant in generate_variants(request, variants, clients):
+            item = BatchVariantResponse(index=variant["index"], quality=variant["quality"], seed=variant["seed"])
+            if "error" in variant:
+                item.error = "Não foi possível gerar esta variante."
+            else:
+                item.image_url = await build_image_url(variant["result"]["images"][0], request.delivery, http_request)
+                item.thumbnail_url = await build_image_url(variant["result"]["thumbnail"], request.delivery, http_request)
+                item.prompt_used = json.dumps(variant["prompt"], indent=2)
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(
+        variant_stream(),
+        media_type="application/x-ndjson",
+    )
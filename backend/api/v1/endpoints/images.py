@@ -0,0 +1,49 @@
+# File: backend/api/v1/endpoints/images.py
+# Entrega binária das imagens geradas a partir do blob store local.
+
+import asyncio
+import os
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from core.blob_store import blob_store
+
+router = APIRouter()
+
+def _lookup(blob_hash: str) -> Optional[Tuple[os.stat_result, str]]:
+    # Corre numa thread: stat e leitura do tipo tocam no disco.
+    stat_result = blob_store.stat(blob_hash)
+    if stat_result is None:
+        return None
+    try:
+        return stat_result, blob_store.content_type(blob_hash)
+    except FileNotFoundError:
+        # Removido pelo cache de resultados entre as duas leituras.
+        return None
+
+@router.get("/{blob_hash}", name="get_image")
+async def get_image(blob_hash: str, request: Request):
+    """
+    Serve a imagem com FileResponse (envio do ficheiro sem cópias para memória quando o servidor suporta),
+    com ETag forte e suporte a pedidos Range. Como o nome é o hash do conteúdo, a resposta nunca muda.
+    """
+    found = await asyncio.to_thread(_lookup, blob_hash)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada.")
+    stat_result, media_type = found
+
+    headers = {
+        "ETag": f'"{blob_hash}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if blob_hash in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        blob_store.path_for(blob_hash),
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat_result,
+    )
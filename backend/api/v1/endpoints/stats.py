@@ -0,0 +1,80 @@
+# File: backend/api/v1/endpoints/stats.py
+# Contadores operacionais (caches, etc.) para dimensionamento e diagnóstico.
+
+from fastapi import APIRouter
+from core.translator import translation_cache
+from core.result_cache import result_cache
+from core.image_generator import generation_flight
+from core.moderation import moderation_flight
+from core.translator import translation_flight, translation_batcher
+from core.jobs import job_manager
+from core.model_router import model_router
+from core.metrics import registry
+from core.postprocess import variant_cache
+from core.admission import admission_controller
+from core.log import dropped_records
+from core.similarity_index import similarity_index
+
+router = APIRouter()
+
+@router.get("/cache")
+def read_cache_stats():
+    """Devolve os contadores de acertos/falhas dos caches e da coalescência de pedidos."""
+    return {
+        "translation": translation_cache.snapshot(),
+        "translation_batching": translation_batcher.snapshot(),
+        "results": result_cache.snapshot(),
+        "variants": variant_cache.snapshot(),
+        "singleflight": {
+            flight.name: flight.snapshot()
+            for flight in (generation_flight, translation_flight, moderation_flight)
+        },
+        "jobs": job_manager.snapshot(),
+        "routing": model_router.snapshot(),
+        "admission": admission_controller.snapshot(),
+        "similarity": similarity_index.snapshot(),
+    }
+
+
+def collect_operational_metrics():
+    """Expõe os mesmos contadores em /metrics; só é chamado no momento do scrape."""
+    yield "mode_cache_events_total", "counter", "Eventos dos caches (acertos, falhas, escritas...).", [
+        ({"cache": cache, "event": event}, value)
+        for cache, stats in (("translation", translation_cache.stats), ("results", result_cache.stats), ("variants", variant_cache.stats), ("similarity", similarity_index.stats))
+        for event, value in stats.items()
+    ]
+    flights = (generation_flight, translation_flight, moderation_flight)
+    yield "mode_singleflight_calls_total", "counter", "Chamadas coalescidas (líderes, juntas a uma em curso, canceladas).", [
+        ({"flight": flight.name, "outcome": outcome}, value)
+        for flight in flights
+        for outcome, value in flight.stats.items()
+    ]
+    yield "mode_singleflight_in_flight", "gauge", "Chamadas únicas ao upstream em curso.", [
+        ({"flight": flight.name}, flight.in_flight()) for flight in flights
+    ]
+    routing = model_router.snapshot()
+    yield "mode_router_events_total", "counter", "Failovers, pedidos hedged e circuitos abertos.", [
+        ({"event": event}, routing[event]) for event in model_router.stats
+    ]
+    yield "mode_model_circuit_open", "gauge", "1 se o circuit breaker do modelo está aberto.", [
+        ({"model": model_id}, 1 if health["circuit"] == "open" else 0) for model_id, health in routing["models"].items()
+    ]
+    yield "mode_jobs_queued", "gauge", "Jobs à espera na fila de cada prefixo de modelo.", [
+        ({"prefix": prefix}, size) for prefix, size in job_manager.snapshot()["queued"].items()
+    ]
+
+    yield "mode_admission_events_total", "counter", "Pedidos admitidos, postos em espera e recusados (por motivo).", [
+        ({"event": event}, value) for event, value in admission_controller.stats.items()
+    ]
+    tiers = admission_controller.snapshot()["tiers"]
+    yield "mode_admission_in_flight", "gauge", "Gerações admitidas em curso, por nível de custo.", [
+        ({"tier": tier}, state["in_flight"]) for tier, state in tiers.items()
+    ]
+    yield "mode_admission_queued", "gauge", "Pedidos à espera de admissão, por nível de custo.", [
+        ({"tier": tier}, state["queued"]) for tier, state in tiers.items()
+    ]
+
+    yield "mode_log_records_dropped_total", "counter", "Registos de log descartados com a fila cheia.", [({}, dropped_records())]
+
+
+registry.register_collector(collect_operational_metrics)
@@ -1,10 +1,74 @@
 # Arquivo: api/v1/router.py
 # Agregador de rotas para a versão v1 da API.
 
-from fastapi import APIRouter
-from .endpoints import generate
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, HTTPException, Request
+from core.admission import AdmissionRejected, admission_controller, admission_tier, client_identity
+from core.config import ADMISSION_CLIENT_HEADER, ADMISSION_ENABLED
+from models.generate import QUALITIES, BatchGenerateRequest, normalize_quality
+from .endpoints import generate, images, stats
+
+# Endpoints sujeitos ao controlo de admissão -> se ocupam slots de geração síncrona.
+# Os jobs só passam pelos token buckets: a geração deles já é limitada pela fila de cada fornecedor.
+ADMITTED_ENDPOINTS = {
+    generate.handle_structured_generation: True,
+    generate.handle_batch_generation: True,
+    generate.submit_generation_job: False,
+}
+
+async def admission_control(http_request: Request) -> AsyncIterator[None]:
+    """
+    Admite (ou recusa com 429 e Retry-After) os pedidos que geram imagens, antes de chegarem ao endpoint.
+    O slot fica ocupado até a resposta ser enviada, incluindo o stream NDJSON dos lotes.
+    """
+    endpoint = http_request.scope.get("endpoint")
+    if not ADMISSION_ENABLED or endpoint not in ADMITTED_ENDPOINTS:
+        yield
+        return
+
+    # O FastAPI já leu o corpo para o validar; aqui só se extrai o que define o custo.
+    try:
+        body = await http_request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        body = {}
+
+    qualities = [body.get("quality")]
+    units = 1
+    if endpoint is generate.handle_batch_generation:
+        count = body.get("count", BatchGenerateRequest.model_fields["count"].default)
+        units = count if isinstance(count, int) and count >= 1 else 1
+        # As variantes usam `qualities` em ciclo: o lote inteiro conta como o nível mais caro da lista.
+        if isinstance(body.get("qualities"), list) and body["qualities"]:
+            qualities = body["qualities"]
+    qualities = [normalize_quality(quality) for quality in qualities]
+    if not all(quality in QUALITIES for quality in qualities):
+        # Corpo inválido: o endpoint devolve 422 sem chegar a gerar nada (nem a gastar orçamento).
+        yield
+        return
+    creative_mode = str(body.get("creative_mode", ""))
+    tier = max((admission_tier(creative_mode, quality) for quality in qualities), key=admission_controller.cost)
+
+    peer = http_request.client.host if http_request.client else None
+    client_id = client_identity(peer, http_request.headers.get(ADMISSION_CLIENT_HEADER))
+    try:
+        async with admission_controller.admit(client_id, tier, units, slots=ADMITTED_ENDPOINTS[endpoint]):
+            yield
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail="O serviço está com muitos pedidos neste momento. Tente novamente dentro de alguns segundos.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
 api_router = APIRouter()
 
-# Inclui a rota de geração
-api_router.include_router(generate.router, prefix="/generate", tags=["Generation"])
+# Inclui a rota de geração, atrás do controlo de admissão
+api_router.include_router(generate.router, prefix="/generate", tags=["Generation"], dependencies=[Depends(admission_control)])
+
+# Inclui a entrega binária das imagens geradas
+api_router.include_router(images.router, prefix="/images", tags=["Images"])
+
+# Inclui as rotas de estatísticas operacionais
+api_router.include_router(stats.router, prefix="/stats", tags=["Stats"])
@@ -0,0 +1,299 @@
+# File: backend/benchmarks/load_test.py
+# Teste de carga do backend contra os stand-ins locais da Fal.ai/OpenAI (sem rede nem custos).
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.load_test --requests 400 --concurrency 32 --time-scale 0.02 --output report.json
+# Em CI, `--time-scale` encolhe as latências simuladas e `--max-p95-ms`, `--min-rps` e
+# `--max-error-rate` fazem o processo terminar com código 1 quando há regressão.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.stub_servers import merge_profile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRESETS_DIR = os.path.join(BACKEND_DIR, "presets")
+
+# Prompts de exemplo, maioritariamente em português (passam pela tradução) e alguns já em inglês.
+SUBJECTS = [
+    "uma caneca de café artesanal", "um logótipo minimalista para uma padaria", "retrato de uma mulher sorridente",
+    "uma sala de estar escandinava", "um tênis de corrida em fundo neutro", "uma cidade futurista ao anoitecer",
+    "a cozy cabin in the mountains", "a bold poster for a jazz festival", "um dragão japonês em aquarela",
+]
+DETAILS = ["", " com luz suave", " em tons pastel", " com muito contraste", " with dramatic lighting", " ao pôr do sol"]
+
+
+def list_presets() -> List[Tuple[str, str]]:
+    """Todos os pares (modo, contexto) com ficheiro de preset, exceto o preset por omissão."""
+    pairs = []
+    for filename in sorted(os.listdir(PRESETS_DIR)):
+        if filename.endswith(".json") and filename != "default.json":
+            mode, _, context = filename[:-len(".json")].partition("_")
+            pairs.append((mode, context))
+    return pairs
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Converte 'low=0.5,med=0.35,high=0.15' em pesos por qualidade."""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {key.strip(): float(weight) for key, weight in pairs}
+
+
+def build_workload(count: int, quality_mix: Dict[str, float], repeat_ratio: float, delivery: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    Percorre os presets em ciclo (todos são exercitados a partir de len(presets) pedidos), sorteia a
+    qualidade pelos pesos indicados e repete uma fração dos pedidos anteriores para exercitar os caches.
+    """
+    presets = list_presets()
+    qualities, weights = zip(*quality_mix.items())
+    workload: List[Dict[str, Any]] = []
+    for index in range(count):
+        if workload and rng.random() < repeat_ratio:
+            workload.append(rng.choice(workload))
+            continue
+        mode, context = presets[index % len(presets)]
+        workload.append({
+            "creative_mode": mode,
+            "context": context,
+            "user_prompt": rng.choice(SUBJECTS) + rng.choice(DETAILS),
+            "modifiers": {},
+            "quality": rng.choices(qualities, weights)[0],
+            "seed": index,
+            "delivery": delivery,
+        })
+    return workload
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Pico de memória residente (VmHWM) do processo; None fora do Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "count": 0}
+    ordered = sorted(values)
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "count": len(ordered)}
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """'provider;dur=812.3, download;dur=40.1' -> {'provider': 812.3, 'download': 40.1}"""
+    timings = {}
+    for item in filter(None, (part.strip() for part in header.split(","))):
+        name, _, params = item.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                timings[name] = float(value)
+    return timings
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"O processo terminou antes de aceitar ligações ({url}).")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"Tempo esgotado à espera de {url}.")
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", *args, "--log-level", "warning"],
+                            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def drive(base_url: str, workload: List[Dict[str, Any]], concurrency: int, fetch_images: bool) -> Tuple[List[Dict[str, Any]], float]:
+    """Envia o workload com `concurrency` clientes em paralelo; devolve as amostras e a duração total."""
+    samples: List[Dict[str, Any]] = []
+    next_index = iter(range(len(workload)))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600.0) as client:
+
+        async def worker():
+            for index in next_index:
+                body = workload[index]
+                start = time.perf_counter()
+                sample: Dict[str, Any] = {"quality": body["quality"]}
+                try:
+                    response = await client.post("/api/v1/generate/", json=body)
+                    sample["status"] = response.status_code
+                    sample["timings"] = parse_server_timing(response.headers.get("server-timing", ""))
+                    sample["cache"] = response.headers.get("x-cache")
+                    if fetch_images and response.status_code == 200 and body["delivery"] == "url":
+                        fetch_start = time.perf_counter()
+                        image = await client.get(response.json()["image_url"])
+                        image.raise_for_status()
+                        sample["timings"]["image_fetch"] = (time.perf_counter() - fetch_start) * 1000
+                except httpx.HTTPError as e:
+                    sample["status"] = type(e).__name__
+                    sample["timings"] = {}
+                sample["latency_ms"] = (time.perf_counter() - start) * 1000
+                samples.append(sample)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, time.perf_counter() - start
+
+
+def build_report(samples: List[Dict[str, Any]], duration: float, args: argparse.Namespace, rss: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    ok = [s for s in samples if s["status"] == 200]
+    stage_values: Dict[str, List[float]] = {}
+    for sample in ok:
+        for stage, ms in sample["timings"].items():
+            stage_values.setdefault(stage, []).append(ms)
+
+    return {
+        "requests": len(samples),
+        "concurrency": args.concurrency,
+        "time_scale": args.time_scale,
+        "duration_s": round(duration, 2),
+        "rps": round(len(samples) / duration, 2) if duration else None,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else None,
+        "status": dict(Counter(str(s["status"]) for s in samples)),
+        "cache_hits": sum(1 for s in ok if s.get("cache") == "HIT"),
+        "latency_ms": percentiles([s["latency_ms"] for s in ok]),
+        "latency_ms_by_quality": {
+            quality: percentiles([s["latency_ms"] for s in ok if s["quality"] == quality])
+            for quality in sorted({s["quality"] for s in samples})
+        },
+        "stages_ms": {stage: percentiles(values) for stage, values in stage_values.items()},
+        "peak_rss_mb": rss,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{report['requests']} pedidos em {report['duration_s']}s "
+          f"(concorrência {report['concurrency']}, time_scale {report['time_scale']})")
+    print(f"  {report['rps']} pedidos/s, taxa de erro {report['error_rate']:.2%}, "
+          f"{report['cache_hits']} acertos de cache, estados {report['status']}")
+    print(f"  RSS máximo (MiB): {report['peak_rss_mb']}")
+    print(f"\n  {'etapa':<16}{'p50':>10}{'p95':>10}{'p99':>10}{'n':>8}")
+    rows = [("end-to-end", report["latency_ms"])] + list(report["stages_ms"].items())
+    for name, stats in rows:
+        if stats["count"]:
+            print(f"  {name:<16}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['count']:>8}")
+
+
+def check_thresholds(report: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    failures = []
+    p95 = report["latency_ms"]["p95"]
+    if args.max_p95_ms is not None and (p95 is None or p95 > args.max_p95_ms):
+        failures.append(f"p95 end-to-end {p95}ms > {args.max_p95_ms}ms")
+    if args.min_rps is not None and (report["rps"] or 0) < args.min_rps:
+        failures.append(f"{report['rps']} pedidos/s < {args.min_rps}")
+    if args.max_error_rate is not None and (report["error_rate"] or 0) > args.max_error_rate:
+        failures.append(f"taxa de erro {report['error_rate']} > {args.max_error_rate}")
+    return failures
+
+
+async def run(args: argparse.Namespace) -> int:
+    profile = merge_profile(json.load(open(args.profile)) if args.profile else {})
+    profile["time_scale"] = args.time_scale
+    if args.image_kb is not None:
+        profile["image_kb"] = args.image_kb
+
+    workdir = tempfile.mkdtemp(prefix="mode-bench-")
+    stub_port, backend_port = free_port(), free_port()
+    stub_url, backend_url = f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{backend_port}"
+
+    stub_env = {**os.environ, "BENCH_PROFILE": json.dumps(profile), "BENCH_STUB_URL": stub_url}
+    backend_env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"{stub_url}/openai/v1",
+        "FAL_KEY": "bench-key:bench-secret",
+        "FAL_RUN_URL": f"{stub_url}/fal/",
+        "CLIENT_WARMUP": "false",
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        # Todos os pedidos vêm do mesmo IP: com o controlo de admissão ligado, o bucket por cliente
+        # dominaria o resultado. Exporte ADMISSION_ENABLED=true para medir o comportamento em sobrecarga.
+        "ADMISSION_ENABLED": os.getenv("ADMISSION_ENABLED", "false"),
+    }
+
+    stubs = start_process(["--factory", "benchmarks.stub_servers:create_app_from_env", "--port", str(stub_port)],
+                          stub_env, os.path.join(workdir, "stubs.log"))
+    backend = start_process(["main:app", "--port", str(backend_port)], backend_env, os.path.join(workdir, "backend.log"))
+    try:
+        await wait_until_ready(f"{stub_url}/docs", stubs)
+        await wait_until_ready(f"{backend_url}/", backend)
+
+        rng = random.Random(args.seed)
+        workload = build_workload(args.requests, parse_mix(args.quality_mix), args.repeat_ratio, args.delivery, rng)
+        samples, duration = await drive(backend_url, workload, args.concurrency, args.fetch_images)
+        rss = {"backend": peak_rss_mb(backend.pid), "stubs": peak_rss_mb(stubs.pid)}
+    finally:
+        for process in (backend, stubs):
+            process.terminate()
+        for process in (backend, stubs):
+            process.wait(timeout=10)
+
+    report = build_report(samples, duration, args, rss)
+    print_report(report)
+    print(f"\n  Logs dos servidores em {workdir}")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"REGRESSÃO: {failure}")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Teste de carga do backend com stand-ins locais da Fal.ai e da OpenAI.")
+    parser.add_argument("--requests", type=int, default=200, help="Número total de pedidos.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Pedidos em simultâneo.")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplica todas as latências simuladas (ex.: 0.02 em CI).")
+    parser.add_argument("--profile", help="Ficheiro JSON com latências/erros por endpoint (sobrepõe-se ao perfil por omissão).")
+    parser.add_argument("--image-kb", type=int, help="Tamanho das imagens simuladas, em KiB.")
+    parser.add_argument("--quality-mix", default="low=0.5,med=0.35,high=0.15", help="Pesos das qualidades.")
+    parser.add_argument("--repeat-ratio", type=float, default=0.1, help="Fração de pedidos que repetem um anterior (caches).")
+    parser.add_argument("--delivery", choices=("url", "inline"), default="url")
+    parser.add_argument("--fetch-images", action="store_true", help="Descarrega também cada imagem devolvida.")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed do gerador do workload (reprodutível).")
+    parser.add_argument("--output", help="Grava o relatório em JSON neste ficheiro.")
+    parser.add_argument("--max-p95-ms", type=float, help="Falha se o p95 end-to-end passar este valor.")
+    parser.add_argument("--min-rps", type=float, help="Falha se o débito ficar abaixo deste valor.")
+    parser.add_argument("--max-error-rate", type=float, help="Falha se a taxa de erro passar este valor.")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# File: backend/benchmarks/stub_servers.py
+# Servidores locais que imitam a Fal.ai, a CDN de imagens e a API da OpenAI, para medir o backend sem custos.
+
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+# Latências (mediana e dispersão de uma distribuição log-normal, em ms) e taxas de erro por endpoint.
+# Valores de ordem de grandeza observados em produção; `time_scale` encolhe-os todos para correr em CI.
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "time_scale": 1.0,
+    "image_kb": 1024,
+    "endpoints": {
+        "fal": {"median_ms": 3000, "sigma": 0.5, "error_rate": 0.01},
+        "cdn": {"median_ms": 120, "sigma": 0.4, "error_rate": 0.0},
+        "openai_images": {"median_ms": 15000, "sigma": 0.3, "error_rate": 0.01},
+        "chat": {"median_ms": 450, "sigma": 0.4, "error_rate": 0.005},
+        "moderations": {"median_ms": 180, "sigma": 0.3, "error_rate": 0.005},
+    },
+    # Fração dos prompts que a moderação simulada bloqueia.
+    "flag_rate": 0.0,
+}
+
+
+def merge_profile(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica um perfil parcial (ex.: lido de um ficheiro JSON) sobre o perfil por omissão."""
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    for key, value in overrides.items():
+        if key == "endpoints":
+            for endpoint, settings in value.items():
+                profile["endpoints"].setdefault(endpoint, {}).update(settings)
+        else:
+            profile[key] = value
+    return profile
+
+
+def make_png(image_kb: int) -> bytes:
+    """PNG válido com ~`image_kb` KiB (ruído quase incompressível, para o tamanho ficar próximo do pedido)."""
+    side = max(8, int((image_kb * 1024 / 3) ** 0.5))
+    noise = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    noise.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def create_stub_app(profile: Dict[str, Any], base_url: str) -> FastAPI:
+    """
+    Endpoints servidos (todos no mesmo processo e porta):
+    - POST /fal/{application}: resposta de `fal_client` run, com o URL da imagem na CDN simulada;
+    - GET /cdn/{name}: bytes da imagem (PNG de `image_kb` KiB, único por nome);
+    - POST /openai/v1/images/generations, /chat/completions e /moderations.
+    """
+    app = FastAPI(title="Stand-ins da Fal.ai e da OpenAI")
+    endpoints = profile["endpoints"]
+    time_scale = profile["time_scale"]
+    image_png = make_png(profile["image_kb"])
+    openai_image_b64 = base64.b64encode(image_png).decode("ascii")
+
+    async def simulate(endpoint: str) -> bool:
+        """Espera a latência sorteada e devolve True se este pedido deve falhar."""
+        settings = endpoints[endpoint]
+        median = max(settings["median_ms"], 0.001)
+        delay = random.lognormvariate(math.log(median), settings.get("sigma", 0.0)) / 1000 * time_scale
+        await asyncio.sleep(delay)
+        return random.random() < settings.get("error_rate", 0.0)
+
+    def error_response() -> JSONResponse:
+        return JSONResponse({"error": {"message": "Erro simulado pelo stand-in.", "type": "server_error"}}, status_code=500)
+
+    @app.post("/fal/{application:path}")
+    async def fal_run(application: str, request: Request):
+        arguments = await request.json()
+        if await simulate("fal"):
+            return error_response()
+        return {
+            "images": [{"url": f"{base_url}/cdn/{uuid.uuid4().hex}.png", "content_type": "image/png"}],
+            "seed": arguments.get("seed", random.randint(0, 2 ** 31 - 1)),
+            "prompt": arguments.get("prompt"),
+        }
+
+    @app.get("/cdn/{name}")
+    async def cdn_image(name: str):
+        if await simulate("cdn"):
+            return Response(status_code=503)
+        # O nome vai depois do bloco IEND (ignorado pelos descodificadores), para que cada imagem
+        # tenha um hash diferente no blob store sem ter de codificar um PNG novo por pedido.
+        return Response(image_png + name.encode("ascii"), media_type="image/png")
+
+    @app.post("/openai/v1/images/generations")
+    async def openai_images():
+        if await simulate("openai_images"):
+            return error_response()
+        return {"created": int(time.time()), "data": [{"b64_json": openai_image_b64}]}
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        if await simulate("chat"):
+            return error_response()
+        text = body["messages"][-1]["content"]
+        if body.get("response_format", {}).get("type") == "json_object":
+            # Pedido em lote do micro-batcher: array JSON de textos -> {"translations": [...]}.
+            text = json.dumps({"translations": [f"[en] {item}" for item in json.loads(text)]}, ensure_ascii=False)
+        else:
+            text = f"[en] {text}"
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.post("/openai/v1/moderations")
+    async def openai_moderations():
+        if await simulate("moderations"):
+            return error_response()
+        return {
+            "id": f"modr-{uuid.uuid4().hex}",
+            "model": "omni-moderation-latest",
+            "results": [{"flagged": random.random() < profile.get("flag_rate", 0.0), "categories": {}, "category_scores": {}}],
+        }
+
+    return app
+
+
+def create_app_from_env() -> FastAPI:
+    """Fábrica para `uvicorn --factory`: lê o perfil e o URL base das variáveis BENCH_PROFILE e BENCH_STUB_URL."""
+    profile = merge_profile(json.loads(os.getenv("BENCH_PROFILE", "{}")))
+    return create_stub_app(profile, os.environ["BENCH_STUB_URL"])
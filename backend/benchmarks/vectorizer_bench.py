@@ -0,0 +1,140 @@
+# File: backend/benchmarks/vectorizer_bench.py
+# Benchmark do vetorizador local em imagens representativas de logótipos e ícones.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.vectorizer_bench                  # imagens sintéticas
+#   python -m benchmarks.vectorizer_bench --images ./logos  # PNG/JPEG/WebP reais
+# Mede, por preset, o tempo de uma vetorização (p50/p95), o tamanho do SVG e o débito com o pool de processos.
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from core.config import PROCESS_POOL_WORKERS
+from core.process_pool import shutdown_process_pool
+from core.vectorizer import VECTORIZE_PRESETS, vectorize_image_data, vectorize_raster
+
+
+def _encode(image: Image.Image, fmt: str = "PNG", **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def synthetic_images(size: int = 1024) -> List[Tuple[str, bytes]]:
+    """Casos típicos: logótipo plano com fundo transparente (gpt-image-1), logótipo com texto em JPEG (Fal.ai),
+    grelha de ícones e um emblema com sombra suave (muitas cores de anti-aliasing)."""
+    s = size / 1024
+    images = []
+
+    logo = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse((112 * s, 112 * s, 912 * s, 912 * s), fill=(24, 70, 180, 255))
+    draw.ellipse((312 * s, 312 * s, 712 * s, 712 * s), fill=(0, 0, 0, 0))
+    draw.polygon([(512 * s, 60 * s), (700 * s, 512 * s), (512 * s, 964 * s), (324 * s, 512 * s)], fill=(245, 180, 30, 255))
+    images.append(("logo_transparente.png", _encode(logo)))
+
+    wordmark = Image.new("RGB", (size, size // 2), (255, 255, 255))
+    draw = ImageDraw.Draw(wordmark)
+    draw.rounded_rectangle((60 * s, 60 * s, 420 * s, 440 * s), radius=int(60 * s), fill=(220, 40, 60))
+    draw.ellipse((140 * s, 140 * s, 340 * s, 340 * s), fill=(255, 255, 255))
+    for i, letter in enumerate("MODE"):
+        x = (480 + i * 120) * s
+        draw.rectangle((x, 160 * s, x + 80 * s, 340 * s), fill=(30, 30, 30))
+        draw.rectangle((x + 20 * s, 200 * s, x + 60 * s, 300 * s), fill=(255, 255, 255) if letter in "OD" else (30, 30, 30))
+    images.append(("logo_texto.jpg", _encode(wordmark, "JPEG", quality=85)))
+
+    icons = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(icons)
+    cell = size // 4
+    for row in range(4):
+        for col in range(4):
+            x, y = col * cell, row * cell
+            color = [(40, 40, 40, 255), (0, 130, 200, 255), (230, 90, 20, 255)][(row + col) % 3]
+            shape = (row * 4 + col) % 3
+            box = (x + cell * 0.2, y + cell * 0.2, x + cell * 0.8, y + cell * 0.8)
+            if shape == 0:
+                draw.ellipse(box, outline=color, width=max(2, int(cell * 0.08)))
+            elif shape == 1:
+                draw.rounded_rectangle(box, radius=int(cell * 0.1), fill=color)
+            else:
+                draw.polygon([(x + cell / 2, y + cell * 0.15), (x + cell * 0.85, y + cell * 0.85), (x + cell * 0.15, y + cell * 0.85)], fill=color)
+    images.append(("icones.png", _encode(icons)))
+
+    badge = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(badge)
+    draw.ellipse((150 * s, 170 * s, 890 * s, 910 * s), fill=(0, 0, 0, 90))
+    badge = badge.filter(ImageFilter.GaussianBlur(24 * s))
+    draw = ImageDraw.Draw(badge)
+    draw.ellipse((130 * s, 130 * s, 870 * s, 870 * s), fill=(20, 140, 90, 255))
+    draw.regular_polygon((500 * s, 500 * s, 250 * s), 5, fill=(250, 250, 240, 255))
+    images.append(("emblema_sombra.png", _encode(badge)))
+    return images
+
+
+def load_images(directory: str) -> List[Tuple[str, bytes]]:
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
+            with open(os.path.join(directory, name), "rb") as handle:
+                images.append((name, handle.read()))
+    return images
+
+
+def time_single(image_data: bytes, preset: str, repeats: int) -> Dict[str, float]:
+    durations, svg = [], ""
+    for _ in range(repeats):
+        start = time.perf_counter()
+        svg = vectorize_raster(image_data, preset)
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    return {
+        "p50_ms": round(statistics.median(durations), 1),
+        "p95_ms": round(durations[min(len(durations) - 1, int(0.95 * len(durations)))], 1),
+        "svg_kb": round(len(svg.encode()) / 1024, 1),
+        "paths": svg.count("<path"),
+    }
+
+
+async def time_pool(images: List[Tuple[str, bytes]], preset: str, rounds: int) -> float:
+    """Imagens por segundo com todas as vetorizações lançadas em simultâneo no pool de processos."""
+    jobs = [data for _ in range(rounds) for _, data in images]
+    start = time.perf_counter()
+    await asyncio.gather(*(vectorize_image_data(data, preset) for data in jobs))
+    return len(jobs) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do vetorizador local.")
+    parser.add_argument("--images", help="Pasta com imagens reais (por omissão, usa imagens sintéticas).")
+    parser.add_argument("--presets", default=",".join(VECTORIZE_PRESETS), help="Presets a medir, separados por vírgulas.")
+    parser.add_argument("--repeats", type=int, default=5, help="Repetições por imagem e preset.")
+    parser.add_argument("--pool-rounds", type=int, default=2, help="Rondas de todas as imagens no teste de débito do pool.")
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else synthetic_images()
+    presets = [p.strip() for p in args.presets.split(",") if p.strip()]
+
+    print(f"{'imagem':<24}{'preset':<10}{'p50 ms':>9}{'p95 ms':>9}{'SVG KiB':>9}{'paths':>7}")
+    for name, data in images:
+        for preset in presets:
+            stats = time_single(data, preset, args.repeats)
+            print(f"{name:<24}{preset:<10}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['svg_kb']:>9}{stats['paths']:>7}")
+
+    print(f"\nDébito com o pool de processos ({PROCESS_POOL_WORKERS} workers):")
+    try:
+        for preset in presets:
+            rate = asyncio.run(time_pool(images, preset, args.pool_rounds))
+            print(f"  {preset:<10}{rate:>8.1f} imagens/s")
+    finally:
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
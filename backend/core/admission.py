@@ -0,0 +1,274 @@
+# File: backend/core/admission.py
+# Controlo de admissão dos pedidos de geração: token buckets (global e por cliente) e orçamento por nível.
+
+import asyncio
+import ipaddress
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from core.config import (
+    ADMISSION_CLIENT_BURST,
+    ADMISSION_CLIENT_HEADER,
+    ADMISSION_CLIENT_RATE,
+    ADMISSION_GLOBAL_BURST,
+    ADMISSION_GLOBAL_RATE,
+    ADMISSION_MAX_CLIENTS,
+    ADMISSION_MAX_QUEUE_TIME,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_TIER_CONCURRENCY,
+    ADMISSION_TIER_COSTS,
+    ADMISSION_TRUSTED_PROXIES,
+)
+from core.image_generator import resolve_model_candidates
+from models.generate import BATCH_MAX_COUNT
+
+# Nível reservado aos slots cujo modelo preferido é o gpt-image-1, de longe o mais caro e o mais lento.
+PREMIUM_TIER = "premium"
+
+
+class AdmissionRejected(Exception):
+    """O pedido não foi admitido; `retry_after` é a estimativa (em segundos) para voltar a tentar."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Pedido recusado ({reason}); tente novamente dentro de {self.retry_after}s.")
+
+
+def admission_tier(creative_mode: str, quality: str) -> str:
+    """Nível de custo do pedido: 'premium' quando o modelo preferido é da OpenAI, senão a própria qualidade."""
+    try:
+        candidates = resolve_model_candidates(creative_mode, quality)
+    except ValueError:
+        # Qualidade desconhecida: o endpoint devolve o erro; aqui conta como o nível normal mais restrito.
+        return "high"
+    return PREMIUM_TIER if candidates[0]["id"].startswith("openai/") else quality.lower()
+
+
+def _parse_networks(items: List[str]) -> List[Any]:
+    return [ipaddress.ip_network(item, strict=False) for item in items]
+
+
+_TRUSTED_PROXIES = _parse_networks(ADMISSION_TRUSTED_PROXIES)
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _TRUSTED_PROXIES)
+
+
+def client_identity(peer: Optional[str], header_value: Optional[str]) -> str:
+    """
+    Identidade usada no bucket do cliente. Uma ligação direta é identificada pelo próprio IP; um pedido
+    vindo de um proxy de confiança, pelo cabeçalho configurado. No X-Forwarded-For conta a entrada mais
+    à direita que não é um proxy de confiança (as da esquerda podem ter sido forjadas pelo cliente).
+    Quando o proxy não identifica o cliente, conta o próprio proxy: os seus pedidos partilham um bucket,
+    mas nunca escapam ao limite por cliente.
+    """
+    if peer is None:
+        return "anonymous"
+    if not _is_trusted_proxy(peer) or not header_value:
+        return peer
+    if ADMISSION_CLIENT_HEADER != "x-forwarded-for":
+        return header_value.strip() or peer
+    for hop in reversed([item.strip() for item in header_value.split(",")]):
+        if hop and not _is_trusted_proxy(hop):
+            return hop
+    return peer
+
+
+class TokenBucket:
+    """`rate` fichas por segundo, até `burst` acumuladas. O saldo pode ficar negativo enquanto há reservas à espera."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost: float, max_wait: float) -> Optional[float]:
+        """
+        Retira `cost` fichas e devolve quanto tempo esperar até elas estarem de facto disponíveis.
+        Se a espera passasse de `max_wait`, não retira nada e devolve None.
+        """
+        self._refill()
+        wait = max(0.0, (cost - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= cost
+        return wait
+
+    def refund(self, cost: float) -> None:
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + cost)
+
+    def retry_after(self, cost: float) -> float:
+        self._refill()
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+
+class TierLimiter:
+    """
+    Semáforo com peso e fila FIFO limitada: no máximo `limit` unidades em curso e `queue_size` pedidos
+    à espera. Quem chega com a fila cheia, ou espera mais do que o tempo dado, é recusado.
+    """
+
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    async def acquire(self, units: int, timeout: float) -> None:
+        if not self._waiters and self.in_flight + units <= self.limit:
+            self.in_flight += units
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise AdmissionRejected("queue_full", timeout)
+        future = asyncio.get_running_loop().create_future()
+        waiter = (units, future)
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # O slot foi entregue no mesmo instante em que a espera acabou: devolve-o.
+                self.release(units)
+            else:
+                future.cancel()
+                self._waiters.remove(waiter)
+                self._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise AdmissionRejected("queue_timeout", timeout) from None
+
+    def release(self, units: int) -> None:
+        self.in_flight -= units
+        self._wake()
+
+    def _wake(self) -> None:
+        # Entrega os slots por ordem de chegada; um pedido grande à cabeça não é ultrapassado pelos pequenos.
+        while self._waiters and self.in_flight + self._waiters[0][0] <= self.limit:
+            units, future = self._waiters.popleft()
+            self.in_flight += units
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_flight": self.in_flight, "queued": len(self._waiters)}
+
+
+class AdmissionController:
+    """
+    Admite um pedido de geração em três passos:
+    1. o token bucket do cliente (sem espera: acima da sua taxa, o cliente recebe 429 de imediato);
+    2. o token bucket global, com espera até `max_queue_time` quando está vazio;
+    3. um slot do nível de custo (`slots`), com fila limitada e o mesmo tempo máximo de espera.
+    Os custos em fichas dependem do nível, por isso um pedido ao gpt-image-1 gasta mais orçamento
+    do que um 'low'. Um pedido recusado devolve as fichas que chegou a retirar.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float, client_rate: float, client_burst: float,
+                 tier_costs: Dict[str, int], tier_concurrency: Dict[str, int], queue_size: int,
+                 max_queue_time: float, max_clients: int, max_units: int = 1):
+        # Um pedido que custa mais do que o burst de um bucket nunca seria admitido (429 com um Retry-After
+        # que nunca se cumpre): falha já no arranque, com a configuração a corrigir.
+        largest = max(tier_costs.values(), default=1) * max_units
+        for name, burst in (("ADMISSION_CLIENT_BURST", client_burst), ("ADMISSION_GLOBAL_BURST", global_burst)):
+            if largest > burst:
+                raise ValueError(
+                    f"{name}={burst:g} não cobre o pedido mais caro ({max_units} variantes no nível mais caro = {largest} fichas)."
+                )
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.tier_costs = tier_costs
+        self.max_queue_time = max_queue_time
+        self.max_clients = max_clients
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.tiers = {tier: TierLimiter(limit, queue_size) for tier, limit in tier_concurrency.items()}
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.stats: Dict[str, int] = {"admitted": 0, "queued": 0, "rejected_client": 0, "rejected_global": 0, "rejected_queue": 0}
+
+    def _client_bucket(self, client_id: str) -> TokenBucket:
+        bucket = self._clients.pop(client_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst)
+            # Memória limitada: esquece o cliente inativo há mais tempo (o seu bucket estaria cheio de novo).
+            if len(self._clients) >= self.max_clients:
+                self._clients.popitem(last=False)
+        self._clients[client_id] = bucket
+        return bucket
+
+    def cost(self, tier: str, units: int = 1) -> float:
+        return self.tier_costs.get(tier, max(self.tier_costs.values(), default=1)) * units
+
+    @asynccontextmanager
+    async def admit(self, client_id: str, tier: str, units: int = 1, slots: bool = True) -> AsyncIterator[None]:
+        """Reserva o orçamento do pedido durante o bloco `async with`; levanta AdmissionRejected se não couber."""
+        cost = self.cost(tier, units)
+        client_bucket = self._client_bucket(client_id)
+        if client_bucket.reserve(cost, max_wait=0) is None:
+            self.stats["rejected_client"] += 1
+            raise AdmissionRejected("client_rate", client_bucket.retry_after(cost))
+
+        wait = self.global_bucket.reserve(cost, max_wait=self.max_queue_time)
+        if wait is None:
+            client_bucket.refund(cost)
+            self.stats["rejected_global"] += 1
+            raise AdmissionRejected("global_rate", self.global_bucket.retry_after(cost))
+
+        limiter = self.tiers.get(tier) if slots else None
+        held = min(units, limiter.limit) if limiter else 0
+        start = time.monotonic()
+        try:
+            if wait > 0 or (limiter and limiter.in_flight + held > limiter.limit):
+                self.stats["queued"] += 1
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if limiter:
+                await limiter.acquire(held, timeout=max(0.0, self.max_queue_time - (time.monotonic() - start)))
+        except BaseException as e:
+            client_bucket.refund(cost)
+            self.global_bucket.refund(cost)
+            if isinstance(e, AdmissionRejected):
+                self.stats["rejected_queue"] += 1
+            raise
+
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            if limiter:
+                limiter.release(held)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "clients": len(self._clients),
+            "global_tokens": round(self.global_bucket.tokens, 2),
+            "tiers": {tier: limiter.snapshot() for tier, limiter in self.tiers.items()},
+        }
+
+
+admission_controller = AdmissionController(
+    ADMISSION_GLOBAL_RATE,
+    ADMISSION_GLOBAL_BURST,
+    ADMISSION_CLIENT_RATE,
+    ADMISSION_CLIENT_BURST,
+    ADMISSION_TIER_COSTS,
+    ADMISSION_TIER_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_MAX_QUEUE_TIME,
+    ADMISSION_MAX_CLIENTS,
+    BATCH_MAX_COUNT,
+)
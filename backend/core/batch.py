@@ -0,0 +1,99 @@
+# File: backend/core/batch.py
+# Geração de várias variantes do mesmo briefing com fan-out limitado.
+
+import asyncio
+import logging
+import random
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from models.generate import BatchGenerateRequest
+from core.clients import ClientManager, client_manager
+from core.config import BATCH_CONCURRENCY
+from core.deadline import deadline_scope, resolve_deadline, within_deadline
+from core.image_generator import generate_image_from_json
+from core.pipeline import StageGraph, add_preparation_stages, compose_final_prompt, request_image_size
+from core.postprocess import postprocess_result
+from core.prompt_composer import apply_modifiers_and_influence
+
+logger = logging.getLogger(__name__)
+
+MAX_SEED = 2 ** 31 - 1
+
+
+async def prepare_batch(request: BatchGenerateRequest, clients: Optional[ClientManager] = None) -> Dict[str, Any]:
+    """Moderação, tradução e carregamento do preset correm uma única vez para todo o lote."""
+    clients = clients or client_manager
+    graph = StageGraph()
+    add_preparation_stages(graph, request, clients, apply_modifiers=not request.vary_influence)
+    results = await graph.run()
+    return {"preset": results["preset"], "translation": results["translation"]}
+
+
+def build_variants(request: BatchGenerateRequest, prepared: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Define cada variante: seed (lista explícita, seed base + índice ou aleatória),
+    qualidade (lista `qualities` em ciclo) e, se `vary_influence`, uma escolha própria de influência de estilo.
+    """
+    variants = []
+    for index in range(request.count):
+        if request.seeds:
+            seed = request.seeds[index % len(request.seeds)]
+        elif request.seed is not None:
+            seed = request.seed + index
+        else:
+            seed = random.randint(0, MAX_SEED)
+
+        preset = prepared["preset"]
+        if request.vary_influence:
+            preset = apply_modifiers_and_influence(preset, request.modifiers, request.creative_mode, request.context)
+        else:
+            preset = dict(preset)
+
+        variants.append({
+            "index": index,
+            "seed": seed,
+            "quality": request.qualities[index % len(request.qualities)] if request.qualities else request.quality,
+            "prompt": compose_final_prompt(preset, prepared["translation"]),
+        })
+    return variants
+
+
+async def generate_variants(request: BatchGenerateRequest, variants: List[Dict[str, Any]], clients: Optional[ClientManager] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Gera as variantes com no máximo BATCH_CONCURRENCY chamadas em simultâneo e entrega cada uma
+    assim que termina. Se o consumidor desistir (ex.: o cliente desligou), as restantes são canceladas.
+    """
+    clients = clients or client_manager
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def generate(variant: Dict[str, Any]) -> Dict[str, Any]:
+        result = await generate_image_from_json(
+            prompt_data=variant["prompt"],
+            creative_mode=request.creative_mode,
+            quality=variant["quality"],
+            image_size=request_image_size(request),
+            seed=variant["seed"],
+            use_cache=not request.bypass_cache,
+            clients=clients
+        )
+        return await postprocess_result(result, request.output_format, request_image_size(request))
+
+    async def run(variant: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                # Cada variante tem o seu próprio prazo (limitado pela qualidade dela), contado a partir do arranque.
+                with deadline_scope(resolve_deadline(request.deadline_seconds, variant["quality"])):
+                    result = await within_deadline("generation", generate(variant))
+                return {**variant, "result": result}
+            except Exception as e:
+                logger.warning("Erro ao gerar a variante %d do lote: %s", variant["index"], e)
+                return {**variant, "error": e}
+
+    tasks = [asyncio.create_task(run(variant)) for variant in variants]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
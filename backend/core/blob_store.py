@@ -0,0 +1,126 @@
+# File: backend/core/blob_store.py
+# Armazenamento local de imagens endereçado pelo conteúdo (SHA-256).
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from typing import AsyncIterable, Dict, Optional
+
+from core.config import BLOB_STORE_DIR
+
+BLOB_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def sniff_image_type(head: bytes) -> str:
+    """Identifica o formato da imagem pelos primeiros bytes (assinatura), não pela extensão ou pelo upstream."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "image/avif"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """
+    Guarda cada imagem uma única vez, num ficheiro cujo nome é o SHA-256 do conteúdo.
+    As escritas vão primeiro para um ficheiro temporário e só depois são renomeadas,
+    por isso um blob visível está sempre completo.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._tmp_dir = os.path.join(root, "tmp")
+
+    def path_for(self, blob_hash: str) -> str:
+        return os.path.join(self.root, blob_hash[:2], blob_hash)
+
+    def _type_path(self, blob_hash: str) -> str:
+        return self.path_for(blob_hash) + ".type"
+
+    def exists(self, blob_hash: str) -> bool:
+        return bool(BLOB_HASH_RE.match(blob_hash)) and os.path.isfile(self.path_for(blob_hash))
+
+    def _open_tmp(self):
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        return os.fdopen(fd, "wb"), tmp_path
+
+    def _commit(self, tmp_path: str, blob_hash: str, content_type: str) -> None:
+        final_path = self.path_for(blob_hash)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # O tipo fica num ficheiro ao lado, escrito antes do blob: um blob visível já tem o tipo gravado.
+        with open(self._type_path(blob_hash), "w") as f:
+            f.write(content_type)
+        # os.replace é atómico; se o blob já existir, o conteúdo é idêntico por definição.
+        os.replace(tmp_path, final_path)
+
+    async def put_stream(self, chunks: AsyncIterable[bytes]) -> Dict[str, object]:
+        """Grava um fluxo de bytes em blocos, calculando o hash enquanto os dados chegam."""
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        f, tmp_path = await asyncio.to_thread(self._open_tmp)
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(f.close)
+            blob_hash = digest.hexdigest()
+            content_type = sniff_image_type(head)
+            await asyncio.to_thread(self._commit, tmp_path, blob_hash, content_type)
+        except BaseException:
+            f.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {"hash": blob_hash, "size": size, "content_type": content_type}
+
+    async def put_bytes(self, data: bytes) -> Dict[str, object]:
+        """Grava bytes já em memória (ex.: o b64_json da OpenAI depois de descodificado)."""
+        async def single_chunk():
+            yield data
+        return await self.put_stream(single_chunk())
+
+    def read_bytes(self, blob_hash: str) -> bytes:
+        with open(self.path_for(blob_hash), "rb") as f:
+            return f.read()
+
+    def content_type(self, blob_hash: str) -> str:
+        """Tipo gravado com o blob; os blobs gravados antes dos ficheiros de tipo são identificados pelo conteúdo."""
+        try:
+            with open(self._type_path(blob_hash)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            with open(self.path_for(blob_hash), "rb") as f:
+                return sniff_image_type(f.read(16))
+
+    def delete(self, blob_hash: str) -> None:
+        for path in (self.path_for(blob_hash), self._type_path(blob_hash)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stat(self, blob_hash: str) -> Optional[os.stat_result]:
+        if not BLOB_HASH_RE.match(blob_hash):
+            return None
+        try:
+            return os.stat(self.path_for(blob_hash))
+        except FileNotFoundError:
+            return None
+
+
+blob_store = BlobStore(BLOB_STORE_DIR)
@@ -0,0 +1,129 @@
+# File: backend/core/clients.py
+# Clientes HTTP/OpenAI/Fal partilhados, geridos pelo ciclo de vida (lifespan) da aplicação.
+
+import asyncio
+import logging
+from typing import Optional
+
+import fal_client
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from core.config import (
+    FAL_KEY,
+    FAL_RUN_URL,
+    FAL_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_READ_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    OPENAI_TIMEOUT,
+    WARMUP_URLS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class ClientManager:
+    """
+    Dono único das ligações de saída do backend:
+    - `http`: cliente httpx com HTTP/2 e keep-alive, usado para descarregar as imagens da CDN;
+    - `openai`: cliente AsyncOpenAI partilhado (moderação, tradução e geração);
+    - `fal`: cliente assíncrono da Fal.ai.
+    Os clientes são criados na primeira utilização (ou em `start`) e fechados em `aclose`.
+    """
+
+    def __init__(self):
+        self._http: Optional[httpx.AsyncClient] = None
+        self._openai: Optional[AsyncOpenAI] = None
+        self._openai_http: Optional[httpx.AsyncClient] = None
+        self._openai_unavailable = False
+        self._fal: Optional[fal_client.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                http2=True,
+                limits=_pool_limits(),
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                follow_redirects=True,
+            )
+        return self._http
+
+    @property
+    def openai(self) -> Optional[AsyncOpenAI]:
+        if self._openai is None and not self._openai_unavailable:
+            # Ele irá ler a chave de API da variável de ambiente OPENAI_API_KEY.
+            try:
+                http_client = DefaultAsyncHttpxClient(http2=True, limits=_pool_limits())
+                self._openai = AsyncOpenAI(
+                    timeout=OPENAI_TIMEOUT,
+                    max_retries=OPENAI_MAX_RETRIES,
+                    http_client=http_client,
+                )
+                self._openai_http = http_client
+            except Exception as e:
+                logger.error("Não foi possível inicializar o cliente OpenAI. Moderação, tradução e geração com a OpenAI estarão desativadas. Erro: %s", e)
+                self._openai_unavailable = True
+        return self._openai
+
+    @property
+    def fal(self) -> fal_client.AsyncClient:
+        if self._fal is None:
+            if FAL_RUN_URL:
+                # O fal_client lê o endpoint desta constante do módulo em cada chamada.
+                fal_client.client.RUN_URL_FORMAT = FAL_RUN_URL
+            self._fal = fal_client.AsyncClient(key=FAL_KEY, default_timeout=FAL_TIMEOUT)
+        return self._fal
+
+    async def start(self, warmup: bool = True) -> None:
+        """Cria os clientes e, opcionalmente, abre antecipadamente as ligações (DNS + TCP + TLS)."""
+        http, openai = self.http, self.openai
+        if not warmup:
+            return
+
+        targets = [http.head(url) for url in WARMUP_URLS]
+        if openai:
+            targets.append(self._openai_http.head(str(openai.base_url)))
+        # O httpx interno da Fal só existe depois da autenticação; sem FAL_KEY, o aquecimento é ignorado.
+        if FAL_KEY:
+            targets.append(self._warm_fal())
+
+        results = await asyncio.gather(*targets, return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning("%d de %d ligações não aqueceram no arranque. Erro: %s", len(failures), len(results), failures[0])
+
+    async def _warm_fal(self) -> None:
+        fal_http = await self.fal._client
+        await fal_http.head(fal_client.client.RUN_URL_FORMAT)
+
+    async def aclose(self) -> None:
+        """Fecha todas as ligações abertas. Seguro de chamar mais de uma vez."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+            self._openai_http = None
+        if self._fal is not None:
+            # O cliente da Fal não expõe `aclose`; fecha-se o httpx que ele criou, se chegou a existir.
+            if "_client" in self._fal.__dict__:
+                fal_http = await self._fal._client
+                await fal_http.aclose()
+            self._fal = None
+
+
+client_manager = ClientManager()
@@ -10,3 +10,123 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 VECTORIZER_API_KEY = os.getenv("VECTORIZER_API_KEY")
 FAL_KEY = os.getenv("FAL_KEY")
+
+# Intervalo mínimo (em segundos) entre verificações de mtime dos ficheiros de preset.
+PRESET_RELOAD_INTERVAL = float(os.getenv("PRESET_RELOAD_INTERVAL", "2.0"))
+
+# Cache de traduções (memória + SQLite partilhado entre os workers do uvicorn).
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache'))
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join(CACHE_DIR, "translations.sqlite3"))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "2048"))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Clientes HTTP partilhados (pool de ligações, timeouts e aquecimento no arranque).
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+FAL_TIMEOUT = float(os.getenv("FAL_TIMEOUT", "120"))
+# Endpoint alternativo da Fal.ai (ex.: servidores de teste locais dos benchmarks). A OpenAI usa OPENAI_BASE_URL.
+FAL_RUN_URL = os.getenv("FAL_RUN_URL")
+CLIENT_WARMUP = os.getenv("CLIENT_WARMUP", "true").lower() == "true"
+WARMUP_URLS = [url for url in os.getenv("WARMUP_URLS", "https://fal.media,https://v3.fal.media").split(",") if url]
+
+# Armazenamento local das imagens geradas (endereçado pelo SHA-256 do conteúdo).
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(CACHE_DIR, "blobs"))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Cache de resultados de geração (índice SQLite + imagens no blob store).
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(CACHE_DIR, "results.sqlite3"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def _parse_int_map(value: str) -> dict:
+    """Converte 'openai=2,fal-ai=8' em {'openai': 2, 'fal-ai': 8}."""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {key.strip(): int(number) for key, number in pairs}
+
+
+def _parse_str_map(value: str) -> dict:
+    """Converte 'httpx=WARNING,core=DEBUG' em {'httpx': 'WARNING', 'core': 'DEBUG'}."""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {key.strip(): text.strip() for key, text in pairs}
+
+
+# Fila de jobs: workers por prefixo de modelo, prioridade por qualidade (menor = primeiro) e retenção dos resultados.
+JOB_CONCURRENCY = _parse_int_map(os.getenv("JOB_CONCURRENCY", "openai=2,fal-ai=8"))
+JOB_PRIORITIES = _parse_int_map(os.getenv("JOB_PRIORITIES", "low=0,med=1,high=2"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+
+# Geração em lote: número máximo de variantes em paralelo por pedido.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Roteamento entre modelos alternativos: janela de métricas, circuit breaker e pedidos "hedged".
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "100"))
+ROUTER_BREAKER_ERROR_RATE = float(os.getenv("ROUTER_BREAKER_ERROR_RATE", "0.5"))
+ROUTER_BREAKER_MIN_CALLS = int(os.getenv("ROUTER_BREAKER_MIN_CALLS", "10"))
+ROUTER_BREAKER_COOLDOWN = float(os.getenv("ROUTER_BREAKER_COOLDOWN", "30"))
+ROUTER_HEDGING = os.getenv("ROUTER_HEDGING", "false").lower() == "true"
+ROUTER_HEDGE_MIN_SAMPLES = int(os.getenv("ROUTER_HEDGE_MIN_SAMPLES", "20"))
+
+# Pool de processos para trabalho de CPU (vetorização, processamento de imagem).
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Vetorização local: presets (modo:contexto) vetorizados por omissão quando o pedido não indica `vectorize`.
+VECTORIZE_CONTEXTS = {
+    tuple(item.strip().split(":", 1))
+    for item in os.getenv("VECTORIZE_CONTEXTS", "branding:logo,branding:icon_set").split(",")
+    if ":" in item
+}
+
+# Pós-processamento: lado maior (em píxeis) da miniatura gerada com cada imagem.
+POSTPROCESS_THUMBNAIL_SIZE = int(os.getenv("POSTPROCESS_THUMBNAIL_SIZE", "256"))
+
+# Micro-batching das traduções (opcional): agrupa os textos que chegam dentro da janela numa só chamada.
+TRANSLATION_BATCHING = os.getenv("TRANSLATION_BATCHING", "false").lower() == "true"
+TRANSLATION_BATCH_WINDOW_MS = float(os.getenv("TRANSLATION_BATCH_WINDOW_MS", "20"))
+TRANSLATION_BATCH_MAX_SIZE = int(os.getenv("TRANSLATION_BATCH_MAX_SIZE", "16"))
+
+# Prazo máximo (em segundos) de cada pedido síncrono, por qualidade; o cliente pode pedir menos com `deadline_seconds`.
+REQUEST_DEADLINE_CAPS = _parse_int_map(os.getenv("REQUEST_DEADLINE_CAPS", "low=60,med=90,high=180"))
+REQUEST_DEADLINE_DEFAULT = float(os.getenv("REQUEST_DEADLINE_DEFAULT", "120"))
+
+# Controlo de admissão dos pedidos de geração. Cada pedido custa fichas conforme o nível
+# ("premium" = modelo preferido da OpenAI, ex.: gpt-image-1 'high'); os buckets repõem fichas por segundo.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", "20"))
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "200"))
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", "1"))
+# O burst de cada bucket tem de cobrir o pedido mais caro (lote máximo no nível mais caro), senão esse pedido nunca entra.
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", "80"))
+ADMISSION_TIER_COSTS = _parse_int_map(os.getenv("ADMISSION_TIER_COSTS", "low=1,med=2,high=4,premium=10"))
+# Gerações síncronas em simultâneo por nível, pedidos à espera por nível e tempo máximo de espera (segundos).
+ADMISSION_TIER_CONCURRENCY = _parse_int_map(os.getenv("ADMISSION_TIER_CONCURRENCY", "low=32,med=16,high=8,premium=4"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_MAX_QUEUE_TIME = float(os.getenv("ADMISSION_MAX_QUEUE_TIME", "10"))
+# Número máximo de clientes com bucket próprio em memória (os inativos há mais tempo são esquecidos).
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+# Identidade do cliente para o bucket próprio. Pedidos vindos de um proxy de confiança (IPs ou redes, ex.: a
+# rota Next.js no mesmo servidor, que acrescenta o endereço real ao X-Forwarded-For) são identificados pelo
+# cabeçalho ADMISSION_CLIENT_HEADER; sem ele, contam como pedidos do próprio proxy.
+ADMISSION_TRUSTED_PROXIES = [item.strip() for item in os.getenv("ADMISSION_TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if item.strip()]
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "x-forwarded-for").lower()
+
+# Logging estruturado: nível global, níveis por logger, formato ("json" ou "text") e tamanho da fila
+# (registos acima dele são descartados em vez de bloquear o event loop).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = _parse_str_map(os.getenv("LOG_LEVELS", "httpx=WARNING,httpcore=WARNING"))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Os argumentos finais enviados ao fornecedor vão para o logger "core.image_generator.arguments" em DEBUG
+# (ligue-o com LOG_LEVELS=core.image_generator.arguments=DEBUG); só esta fração das chamadas é registada.
+LOG_PROVIDER_ARGUMENTS_SAMPLE_RATE = float(os.getenv("LOG_PROVIDER_ARGUMENTS_SAMPLE_RATE", "1.0"))
+
+# Índice de prompts quase duplicados (MinHash/LSH): reutiliza uma geração recente quando o pedido
+# tem `reuse_similar` e o prompt traduzido tem semelhança (Jaccard das palavras) acima do limiar.
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", os.path.join(CACHE_DIR, "similar.sqlite3"))
+SIMILARITY_INDEX_MAX_ENTRIES = int(os.getenv("SIMILARITY_INDEX_MAX_ENTRIES", "200000"))
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
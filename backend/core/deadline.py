@@ -0,0 +1,151 @@
+# File: backend/core/deadline.py
+# Prazo de cada pedido, propagado às etapas e às chamadas ao upstream como tempo restante.
+
+import asyncio
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from core.config import REQUEST_DEADLINE_CAPS, REQUEST_DEADLINE_DEFAULT
+
+_EXPIRY_TOLERANCE = 0.05
+
+
+class DeadlineExceeded(Exception):
+    """O prazo do pedido esgotou-se antes de a etapa terminar."""
+
+    def __init__(self, stage: str, budget: float):
+        self.stage = stage
+        self.budget = budget
+        super().__init__(f"Prazo de {budget:.1f}s esgotado na etapa '{stage}'.")
+
+
+class ClientDisconnected(Exception):
+    """O cliente fechou a ligação antes de a resposta estar pronta."""
+
+
+class Deadline:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def extend_to(self, other: Optional["Deadline"]) -> None:
+        """Alarga este prazo até ao fim de `other`; um pedido sem prazo (None) deixa-o sem fim."""
+        if other is None:
+            self.budget = self.expires_at = math.inf
+        else:
+            self.budget = max(self.budget, other.budget)
+            self.expires_at = max(self.expires_at, other.expires_at)
+
+
+# As tarefas criadas dentro do pedido (etapas do grafo, hedging) herdam uma cópia do contexto; as partilhadas
+# entre pedidos (single-flight, lotes de tradução) correm com o prazo mais longo deles (ver `shared_deadline`).
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def resolve_deadline(requested: Optional[float], quality: str) -> float:
+    """Prazo pedido pelo cliente, limitado ao máximo do servidor para a qualidade (ou o máximo, sem pedido)."""
+    cap = float(REQUEST_DEADLINE_CAPS.get(quality.lower(), REQUEST_DEADLINE_DEFAULT))
+    return min(requested, cap) if requested else cap
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(budget: float) -> Iterator[Deadline]:
+    deadline = Deadline(budget)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def shared_deadline(*deadlines: Optional[Deadline]) -> Deadline:
+    """
+    Prazo de trabalho partilhado por vários pedidos: o mais longo entre os deles (sem fim, se algum não
+    tiver prazo), para que as chamadas ao upstream não sejam cortadas pelo pedido mais apressado. Cada
+    pedido continua a limitar a sua própria espera com `within_deadline`. Pedidos que se juntam depois
+    alargam-no com `extend_to`; as chamadas já em curso mantêm o timeout com que arrancaram.
+    """
+    shared = Deadline(0.0)
+    shared.budget = shared.expires_at = -math.inf
+    for deadline in deadlines:
+        shared.extend_to(deadline)
+    return shared
+
+
+def context_with_deadline(deadline: Optional[Deadline]) -> contextvars.Context:
+    """Cópia do contexto atual (id do pedido incluído) com outro prazo, para criar uma tarefa partilhada."""
+    context = contextvars.copy_context()
+    context.run(_current_deadline.set, deadline)
+    return context
+
+
+def deadline_expired() -> bool:
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.expired
+
+
+def remaining_timeout(default: float) -> float:
+    """Timeout para uma chamada ao upstream: o tempo restante do pedido, sem passar o timeout configurado."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    return min(default, deadline.remaining())
+
+
+async def within_deadline(stage: str, awaitable: Awaitable[Any]) -> Any:
+    """
+    Espera por `awaitable` no máximo o tempo restante do pedido e levanta DeadlineExceeded se o prazo acabar.
+    Erros que chegam já depois do prazo (ex.: o timeout do SDK, calculado com o mesmo tempo restante)
+    também são reportados como DeadlineExceeded. Sem prazo no contexto, é um simples `await`.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    if deadline.expired:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(stage, deadline.budget)
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # Tolerância para a resolução do relógio do event loop, que pode disparar o timer ligeiramente antes.
+        if deadline.remaining() <= _EXPIRY_TOLERANCE:
+            raise DeadlineExceeded(stage, deadline.budget) from e
+        raise
+
+
+async def run_until_disconnected(awaitable: Awaitable[Any], is_disconnected: Callable[[], Awaitable[bool]], poll_interval: float = 0.5) -> Any:
+    """
+    Corre `awaitable` numa tarefa e cancela-a (com as chamadas ao upstream em curso) se o cliente
+    desligar entretanto; nesse caso levanta ClientDisconnected.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -1,58 +1,75 @@
 # File: backend/core/image_generator.py
-import fal_client
-import json
-import httpx
 import base64
-from typing import Dict, Any, Optional
-from openai import AsyncOpenAI
+import logging
+import httpx
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from core.clients import ClientManager, client_manager
+from core.blob_store import blob_store
+from core.config import DOWNLOAD_CHUNK_SIZE, FAL_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, LOG_PROVIDER_ARGUMENTS_SAMPLE_RATE, OPENAI_TIMEOUT
+from core.deadline import remaining_timeout
+from core.log import should_sample
+from core.metrics import provider_in_flight, span
+from core.model_router import model_router
+from core.result_cache import generation_cache_key, result_cache
+from core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+# Dumps dos argumentos enviados ao fornecedor: em DEBUG e amostrados, por serem volumosos.
+arguments_logger = logging.getLogger(f"{__name__}.arguments")
 
-# Inicializa o cliente da OpenAI.
-try:
-    openai_client = AsyncOpenAI()
-except Exception as e:
-    print(f"AVISO: Não foi possível inicializar o cliente OpenAI. A geração com DALL-E 3 estará desativada. Erro: {e}")
-    openai_client = None
+# Pedidos idênticos em curso (duplo clique, novas tentativas do cliente) partilham uma única geração.
+generation_flight = SingleFlight("generation")
+
+# Modelos de reserva, reutilizados como alternativas nos slots abaixo.
+IMAGEN4_ULTRA = {"id": "fal-ai/imagen4/preview/ultra", "params": {}}
+SEEDREAM_V3 = {"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {}}
 
 # MODEL_MAP FINAL com os ajustes finais.
+# Cada slot lista os modelos por ordem de preferência; os seguintes são alternativas
+# usadas pelo model_router em caso de falha, circuit breaker aberto ou pedido "hedged".
 MODEL_MAP = {
     "free": {
-        "low": {"id": "fal-ai/imagen4/preview", "params": {}},
-        "med": {"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {}},
-        "high": {"id": "openai/gpt-image-1", "params": {"quality": "high"}}
+        "low": [{"id": "fal-ai/imagen4/preview", "params": {}}, SEEDREAM_V3],
+        "med": [SEEDREAM_V3, {"id": "fal-ai/imagen4/preview", "params": {}}],
+        "high": [{"id": "openai/gpt-image-1", "params": {"quality": "high"}}, IMAGEN4_ULTRA]
     },
     "branding": {
-        "low": {"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "digital_illustration"}},
-        "med": {"id": "fal-ai/ideogram/v3", "params": {"style": "DESIGN", "rendering_speed": "QUALITY", "expand_prompt": True}},
-        "high": {"id": "openai/gpt-image-1", "params": {"quality": "high", "background":"transparent"}}
+        "low": [{"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "digital_illustration"}}, {"id": "fal-ai/ideogram/v3", "params": {"style": "DESIGN"}}],
+        "med": [{"id": "fal-ai/ideogram/v3", "params": {"style": "DESIGN", "rendering_speed": "QUALITY", "expand_prompt": True}}, {"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "digital_illustration"}}],
+        "high": [{"id": "openai/gpt-image-1", "params": {"quality": "high", "background":"transparent"}}, {"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "digital_illustration"}}]
     },
     "web-design": {
-        "low": {"id": "fal-ai/ideogram/v3", "params": {"style": "DESIGN"}},
-        "med": {"id": "fal-ai/imagen4/preview/ultra", "params": {}},
-        "high": {"id": "openai/gpt-image-1", "params": {"quality": "high"}}
+        "low": [{"id": "fal-ai/ideogram/v3", "params": {"style": "DESIGN"}}, {"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "digital_illustration"}}],
+        "med": [IMAGEN4_ULTRA, {"id": "fal-ai/ideogram/v3", "params": {"style": "DESIGN"}}],
+        "high": [{"id": "openai/gpt-image-1", "params": {"quality": "high"}}, IMAGEN4_ULTRA]
     },
     "social-media": {
-        "low": {"id": "fal-ai/hidream-i1-dev", "params": {}},
-        "med": {"id": "fal-ai//imagen4/preview/ultra", "params": {}},
-        "high": {"id": "openai/gpt-image-1", "params": {"quality": "high"}}
+        "low": [{"id": "fal-ai/hidream-i1-dev", "params": {}}, {"id": "fal-ai/imagen4/preview", "params": {}}],
+        "med": [IMAGEN4_ULTRA, SEEDREAM_V3],
+        "high": [{"id": "openai/gpt-image-1", "params": {"quality": "high"}}, IMAGEN4_ULTRA]
     },
     "people": {
-        "low": {"id": "fal-ai/flux-pro/kontext/max/text-to-image", "params": {}},
-        "med": {"id": "fal-ai/imagen-4/preview/ultra", "params": {}},
-        "high": {"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {"guidance_scale": 7.5}}
+        "low": [{"id": "fal-ai/flux-pro/kontext/max/text-to-image", "params": {}}, SEEDREAM_V3],
+        "med": [IMAGEN4_ULTRA, {"id": "fal-ai/flux-pro/kontext/max/text-to-image", "params": {}}],
+        "high": [{"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {"guidance_scale": 7.5}}, IMAGEN4_ULTRA]
     },
     "physical-spaces": {
-        "low": {"id": "fal-ai/imagen4/preview/ultra", "params": {}},
-        "med": {"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "realistic_image"}},
-        "high": {"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {}}
+        "low": [IMAGEN4_ULTRA, SEEDREAM_V3],
+        "med": [{"id": "fal-ai/recraft/v3/text-to-image", "params": {"style": "realistic_image"}}, IMAGEN4_ULTRA],
+        "high": [SEEDREAM_V3, IMAGEN4_ULTRA]
     },
     "product": {
-        "low": {"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {"guidance_scale": 7.5}},
-        "med": {"id": "fal-ai/ideogram/v3", "params": {"style": "PRODUCT", "rendering_speed": "QUALITY"}},
-        "high": {"id": "openai/gpt-image-1", "params": {"quality": "high"}}
+        "low": [{"id": "fal-ai/bytedance/seedream/v3/text-to-image", "params": {"guidance_scale": 7.5}}, {"id": "fal-ai/imagen4/preview", "params": {}}],
+        "med": [{"id": "fal-ai/ideogram/v3", "params": {"style": "PRODUCT", "rendering_speed": "QUALITY"}}, SEEDREAM_V3],
+        "high": [{"id": "openai/gpt-image-1", "params": {"quality": "high"}}, IMAGEN4_ULTRA]
     }
 }
 
 def build_prompt_from_dict(data: Any) -> str:
+    # Os valores vindos do registo de presets já trazem o fragmento pré-calculado.
+    fragment = getattr(data, "prompt_fragment", None)
+    if fragment is not None: return fragment
     if isinstance(data, dict): return ", ".join(build_prompt_from_dict(v) for v in data.values())
     if isinstance(data, list): return ", ".join(str(item) for item in data)
     return str(data)
@@ -66,31 +83,62 @@ def convert_json_to_string_prompt(prompt_data: Dict[str, Any]) -> str:
             parts.append(build_prompt_from_dict(value))
     return ", ".join(filter(None, parts))
 
-async def generate_image_from_json(prompt_data: Dict[str, Any], creative_mode: str, quality: str, image_size: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+# Tamanhos aceites pelo gpt-image-1.
+OPENAI_IMAGE_SIZES = ((1024, 1024), (1536, 1024), (1024, 1536))
+
+def openai_image_size(width: int, height: int) -> str:
+    """Tamanho suportado com a proporção mais próxima da pedida."""
+    best = min(OPENAI_IMAGE_SIZES, key=lambda size: abs(size[0] / size[1] - width / height))
+    return f"{best[0]}x{best[1]}"
+
+def resolve_model_slot(creative_mode: str, quality: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Devolve a chave do MODEL_MAP efetivamente usada (após o fallback para o modo 'free') e os seus modelos
+    para a qualidade, por ordem de preferência. A chave, ao contrário do modo enviado pelo cliente, tem
+    um conjunto fechado de valores e pode servir de label nas métricas.
+    """
     mode_key = creative_mode.lower().replace(' ', '-')
     quality_key = quality.lower()
     
     # Lógica de fallback atualizada para usar o modo "free"
-    model_config = MODEL_MAP.get(mode_key, {}).get(quality_key)
-    if not model_config:
-        print(f"Aviso: Combinação de modo/qualidade não encontrada. Usando o fallback para 'free'.")
-        model_config = MODEL_MAP["free"].get(quality_key)
-    
-    model_id = model_config["id"]
-    model_params = model_config.get("params", {}).copy()
-    final_text_prompt = convert_json_to_string_prompt(prompt_data)
-    negative_prompt = prompt_data.get("negative_prompt", "")
+    candidates = MODEL_MAP.get(mode_key, {}).get(quality_key)
+    if not candidates:
+        logger.warning("Combinação de modo/qualidade não encontrada. Usando o fallback para 'free'.", extra={"mode": creative_mode, "quality": quality})
+        mode_key = "free"
+        candidates = MODEL_MAP["free"].get(quality_key)
+    if not candidates:
+        raise ValueError(f"Qualidade desconhecida: '{quality}'.")
+    return mode_key, candidates
 
-    print(f"Roteando para o modelo: '{model_id}'")
+def resolve_model_candidates(creative_mode: str, quality: str) -> List[Dict[str, Any]]:
+    """Devolve os modelos do MODEL_MAP para o modo/qualidade, por ordem de preferência, com fallback para o modo 'free'."""
+    return resolve_model_slot(creative_mode, quality)[1]
 
-    # Funde os parâmetros da UI com os defaults do modelo
-    if image_size:
-        if model_id.startswith("openai/"):
-            model_params["size"] = f"{image_size['width']}x{image_size['height']}"
-        else:
-            model_params["image_size"] = image_size
+def resolve_model_config(creative_mode: str, quality: str) -> Dict[str, Any]:
+    """Devolve o modelo preferido (ainda disponível segundo o model_router) para o modo/qualidade."""
+    return model_router.order(resolve_model_candidates(creative_mode, quality))[0]
+
+def _log_arguments(model_id: str, arguments: Dict[str, Any]) -> None:
+    # O dicionário segue por referência e só é serializado na thread do logging, se o registo for emitido.
+    if arguments_logger.isEnabledFor(logging.DEBUG) and should_sample(LOG_PROVIDER_ARGUMENTS_SAMPLE_RATE):
+        arguments_logger.debug("Argumentos finais para o fornecedor", extra={"model": model_id, "arguments": arguments})
+
+@contextmanager
+def _in_flight(model_id: str) -> Iterator[None]:
+    provider_in_flight.inc(model=model_id)
+    try:
+        yield
+    finally:
+        provider_in_flight.dec(model=model_id)
+
+async def _call_provider(model_id: str, model_params: Dict[str, Any], final_text_prompt: str, negative_prompt: str, clients: ClientManager, on_progress: Optional[Callable[[str], None]] = None, mode: str = "") -> Dict[str, Any]:
+    """Faz a chamada ao fornecedor (OpenAI ou Fal.ai) e grava a imagem resultante no blob store."""
+    if on_progress:
+        on_progress("running")
+    labels = {"model": model_id, "mode": mode}
 
     if model_id.startswith("openai/"):
+        openai_client = clients.openai
         if not openai_client: raise ConnectionError("Cliente OpenAI não inicializado.")
         
         # Usa "gpt-image-1" se for o ID, senão usa o nome correto (dall-e-3)
@@ -98,28 +146,96 @@ async def generate_image_from_json(prompt_data: Dict[str, Any], creative_mode: s
         
         arguments = {"model": model_name, "prompt": final_text_prompt, "n": 1, "response_format": "b64_json", **model_params}
         
-        print(f"Argumentos Finais para OpenAI: {arguments}")
-        result = await openai_client.images.generate(**arguments)
+        _log_arguments(model_id, arguments)
+        with span("provider", **labels), _in_flight(model_id):
+            result = await openai_client.images.generate(**arguments, timeout=remaining_timeout(OPENAI_TIMEOUT))
         
-        image_b64 = result.data[0].b64_json
-        return {"images": [{"url": f"data:image/png;base64,{image_b64}"}], "seed": None}
+        # A OpenAI só devolve a imagem em base64; descodifica-se uma vez e grava-se no blob store.
+        with span("store", **labels):
+            image_bytes = base64.b64decode(result.data[0].b64_json)
+            blob = await blob_store.put_bytes(image_bytes)
+        return {"images": [blob], "seed": None}
 
     elif model_id.startswith("fal-ai/"):
-        arguments = model_params
+        arguments = dict(model_params)
         arguments["prompt"] = final_text_prompt
         if negative_prompt: arguments["negative_prompt"] = negative_prompt
         
-        print(f"Argumentos Finais para Fal.ai: {json.dumps(arguments, indent=2)}")
-        result = await fal_client.run_async(model_id, arguments=arguments)
+        _log_arguments(model_id, arguments)
+        with span("provider", **labels), _in_flight(model_id):
+            result = await clients.fal.run(model_id, arguments=arguments, timeout=remaining_timeout(FAL_TIMEOUT))
         
+        # Reutiliza o pool de ligações partilhado em vez de um handshake TCP+TLS novo por imagem,
+        # e transfere a imagem em blocos diretamente para o blob store, sem a manter inteira em memória.
         image_url = result["images"][0]["url"]
-        async with httpx.AsyncClient() as client:
-            response = await client.get(image_url)
-            response.raise_for_status()
-            image_b64 = base64.b64encode(response.content).decode("utf-8")
-        
-        result["images"][0]["url"] = f"data:image/png;base64,{image_b64}"
-        return result
+        if on_progress:
+            on_progress("downloading")
+        with span("download", **labels):
+            # O timeout de leitura do httpx é por bloco; o prazo total da transferência é imposto pela etapa.
+            timeout = httpx.Timeout(remaining_timeout(HTTP_READ_TIMEOUT), connect=remaining_timeout(HTTP_CONNECT_TIMEOUT))
+            async with clients.http.stream("GET", image_url, timeout=timeout) as response:
+                response.raise_for_status()
+                blob = await blob_store.put_stream(response.aiter_bytes(DOWNLOAD_CHUNK_SIZE))
+
+        return {"images": [blob], "seed": result.get("seed")}
 
     else:
-        raise ValueError(f"Prefixo de modelo desconhecido: '{model_id}'.")
\ No newline at end of file
+        raise ValueError(f"Prefixo de modelo desconhecido: '{model_id}'.")
+
+async def generate_image_from_json(prompt_data: Dict[str, Any], creative_mode: str, quality: str, image_size: Optional[Dict[str, int]] = None, seed: Optional[int] = None, use_cache: bool = True, clients: Optional[ClientManager] = None, on_progress: Optional[Callable[[str], None]] = None, provider: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Escolhe o modelo para o modo/qualidade, monta a chamada final e devolve o resultado.
+    Com `provider` (prefixo do id, ex.: 'fal-ai'), só os modelos desse fornecedor são tentados, incluindo no failover.
+    Chamadas idênticas (modelo, parâmetros, prompt final, negative_prompt e seed) são servidas
+    pelo cache de resultados; `use_cache=False` ignora a leitura do cache (o resultado novo é gravado na mesma).
+    `on_progress` recebe as transições "running" (chamada ao fornecedor) e "downloading" (transferência da CDN).
+    """
+    clients = clients or client_manager
+    final_text_prompt = convert_json_to_string_prompt(prompt_data)
+    negative_prompt = prompt_data.get("negative_prompt", "")
+    mode_key, candidates = resolve_model_slot(creative_mode, quality)
+    if provider is not None:
+        candidates = [c for c in candidates if c["id"].split("/", 1)[0] == provider]
+        if not candidates:
+            raise ValueError(f"Nenhum modelo do fornecedor '{provider}' para o modo/qualidade pedidos.")
+
+    async def generate_with_model(model_config: Dict[str, Any]) -> Dict[str, Any]:
+        return await _generate_with_model(model_config, final_text_prompt, negative_prompt, image_size, seed, use_cache, clients, on_progress, mode_key)
+
+    # O model_router escolhe entre as alternativas do slot (failover, circuit breaker e hedging).
+    return await model_router.call(candidates, generate_with_model)
+
+async def _generate_with_model(model_config: Dict[str, Any], final_text_prompt: str, negative_prompt: str, image_size: Optional[Dict[str, int]], seed: Optional[int], use_cache: bool, clients: ClientManager, on_progress: Optional[Callable[[str], None]], mode: str = "") -> Dict[str, Any]:
+    model_id = model_config["id"]
+    model_params = model_config.get("params", {}).copy()
+
+    logger.info("Roteando para o modelo", extra={"model": model_id})
+
+    # Funde os parâmetros da UI com os defaults do modelo
+    if image_size:
+        if model_id.startswith("openai/"):
+            # A OpenAI só aceita alguns tamanhos fixos; o corte para as dimensões exatas é feito no pós-processamento.
+            model_params["size"] = openai_image_size(image_size["width"], image_size["height"])
+        else:
+            model_params["image_size"] = image_size
+    # A API de imagens da OpenAI não aceita seed; só os modelos da Fal.ai a recebem.
+    if seed is not None and model_id.startswith("fal-ai/"):
+        model_params["seed"] = seed
+
+    cache_key = generation_cache_key(model_id, model_params, final_text_prompt, negative_prompt, seed)
+
+    async def generate() -> Dict[str, Any]:
+        if use_cache:
+            with span("cache", model=model_id, mode=mode):
+                cached = await result_cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True, "cache_key": cache_key}
+        else:
+            result_cache.record_bypass()
+
+        result = await _call_provider(model_id, model_params, final_text_prompt, negative_prompt, clients, on_progress, mode)
+        await result_cache.put(cache_key, {**result, "model_id": model_id})
+        return {**result, "model_id": model_id, "cached": False, "cache_key": cache_key}
+
+    # Um pedido com bypass nunca se junta a um que possa devolver o resultado em cache.
+    return await generation_flight.do((cache_key, use_cache), generate)
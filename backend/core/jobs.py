@@ -0,0 +1,246 @@
+# File: backend/core/jobs.py
+# Fila de jobs de geração assíncrona, com concorrência limitada por fornecedor e eventos de progresso.
+
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from models.generate import GenerateRequest
+from core.clients import ClientManager, client_manager
+from core.config import JOB_CONCURRENCY, JOB_PRIORITIES, JOB_RESULT_TTL
+from core.deadline import DeadlineExceeded, deadline_scope, resolve_deadline, within_deadline
+from core.image_generator import generate_image_from_json, resolve_model_config
+from core.log import current_request_id, request_context
+from core.moderation import PromptFlaggedError
+from core.pipeline import prepare_generation, remember_generation, request_image_size
+from core.postprocess import postprocess_result
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class QueueBackend(ABC):
+    """
+    Interface da fila usada pelos workers. Menor prioridade = atendido primeiro;
+    empates são resolvidos por ordem de chegada. Outras implementações (ex.: Redis)
+    só precisam de implementar estes três métodos (senão nem chegam a ser instanciadas).
+    """
+
+    @abstractmethod
+    async def put(self, priority: int, job_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self) -> str:
+        ...
+
+    @abstractmethod
+    def qsize(self) -> int:
+        ...
+
+
+class InMemoryQueueBackend(QueueBackend):
+    """Fila de prioridades em memória, local ao processo (a implementação por omissão)."""
+
+    def __init__(self):
+        self._queue: "asyncio.PriorityQueue" = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+
+    async def put(self, priority: int, job_id: str) -> None:
+        await self._queue.put((priority, next(self._counter), job_id))
+
+    async def get(self) -> str:
+        _, _, job_id = await self._queue.get()
+        return job_id
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class Job:
+    """Estado de um job de geração e histórico das transições de etapa."""
+
+    def __init__(self, request: GenerateRequest):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        # Id do pedido HTTP que submeteu o job, para correlacionar os registos do worker com ele.
+        self.request_id = current_request_id() or self.id
+        self.status = "pending"
+        self.stage: Optional[str] = None
+        self.prompt: Optional[Dict[str, Any]] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.events: List[Dict[str, Any]] = []
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def emit(self, stage: str, status: Optional[str] = None) -> None:
+        self.stage = stage
+        if status:
+            self.status = status
+        self.updated_at = time.time()
+        event = {"job_id": self.id, "status": self.status, "stage": stage, "timestamp": self.updated_at}
+        self.events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Devolve uma fila com o histórico já emitido seguido dos eventos futuros."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        if not self.finished:
+            self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+
+class JobManager:
+    """
+    Recebe jobs, corre as etapas de preparação (moderação, tradução, preset) e enfileira a geração
+    na fila do fornecedor correspondente (prefixo do id do modelo no MODEL_MAP). Cada prefixo tem
+    a sua fila e o seu próprio número de workers, por isso um fornecedor lento não bloqueia os outros.
+    """
+
+    def __init__(self, concurrency: Dict[str, int], priorities: Dict[str, int], result_ttl: float,
+                 queue_factory: Callable[[], QueueBackend] = InMemoryQueueBackend):
+        self.concurrency = concurrency
+        self.priorities = priorities
+        self.result_ttl = result_ttl
+        self.queue_factory = queue_factory
+        self.clients: ClientManager = client_manager
+        self._jobs: Dict[str, Job] = {}
+        self._queues: Dict[str, QueueBackend] = {}
+        self._workers: List[asyncio.Task] = []
+        self._background: set = set()
+
+    async def start(self, clients: Optional[ClientManager] = None) -> None:
+        self.clients = clients or client_manager
+        for prefix, workers in self.concurrency.items():
+            self._queues[prefix] = self.queue_factory()
+            for _ in range(workers):
+                self._workers.append(asyncio.create_task(self._worker(prefix)))
+
+    async def stop(self) -> None:
+        tasks = self._workers + list(self._background)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+
+    def submit(self, request: GenerateRequest) -> Job:
+        self._purge_expired()
+        job = Job(request)
+        self._jobs[job.id] = job
+        job.emit("submitted", "pending")
+        # A preparação não ocupa um lugar do fornecedor; só a geração passa pela fila.
+        task = asyncio.create_task(self._prepare_and_enqueue(job))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _queue_for(self, model_id: str) -> QueueBackend:
+        prefix = model_id.split("/", 1)[0]
+        if prefix not in self._queues:
+            raise ValueError(f"Nenhum worker configurado para o prefixo de modelo '{prefix}'.")
+        return self._queues[prefix]
+
+    def _fail(self, job: Job, error: Exception) -> None:
+        if isinstance(error, PromptFlaggedError):
+            job.error, job.error_status = "O seu prompt viola as nossas políticas de conteúdo e segurança.", 400
+        elif isinstance(error, DeadlineExceeded):
+            logger.warning("O job excedeu o prazo: %s", error, extra={"job_id": job.id})
+            job.error, job.error_status = "A geração excedeu o tempo limite. Tente novamente mais tarde.", 504
+        elif isinstance(error, FileNotFoundError):
+            job.error, job.error_status = f"Erro de configuração do servidor: {error}", 404
+        else:
+            logger.error("Ocorreu um erro inesperado durante o job: %s", error, exc_info=error, extra={"job_id": job.id})
+            job.error, job.error_status = "Não foi possível gerar a imagem. Tente novamente mais tarde.", 500
+        job.emit("failed", "failed")
+
+    async def _prepare_and_enqueue(self, job: Job) -> None:
+        request = job.request
+        try:
+            with deadline_scope(resolve_deadline(None, request.quality)):
+                prepared = await prepare_generation(
+                    request,
+                    self.clients,
+                    on_stage=lambda stage: job.emit(stage, "preparing") if stage in ("moderation", "translation") else None,
+                )
+            job.prompt = prepared["prompt"]
+            model_id = resolve_model_config(request.creative_mode, request.quality)["id"]
+            queue = self._queue_for(model_id)
+            job.emit("queued", "queued")
+            await queue.put(self.priorities.get(request.quality.lower(), max(self.priorities.values(), default=0)), job.id)
+        except Exception as e:
+            self._fail(job, e)
+
+    async def _worker(self, prefix: str) -> None:
+        # O job só é gerado com modelos do fornecedor desta fila: o failover não pode passar para outro
+        # fornecedor, cujas chamadas escapariam ao limite de concorrência dele.
+        queue = self._queues[prefix]
+        while True:
+            job_id = await queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                continue
+            request = job.request
+            try:
+                # O cliente não espera pela resposta, mas o máximo da qualidade impede que uma chamada
+                # pendurada ocupe o worker indefinidamente (o prazo conta a partir da saída da fila).
+                with request_context(job.request_id), deadline_scope(resolve_deadline(None, request.quality)):
+                    job.result = await within_deadline("generation", self._generate(job, prefix))
+                job.emit("completed", "completed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._fail(job, e)
+
+    async def _generate(self, job: Job, provider: str) -> Dict[str, Any]:
+        request = job.request
+        result = await generate_image_from_json(
+            prompt_data=job.prompt,
+            creative_mode=request.creative_mode,
+            quality=request.quality,
+            image_size=request_image_size(request),
+            seed=request.seed,
+            use_cache=not request.bypass_cache,
+            clients=self.clients,
+            on_progress=lambda stage: job.emit(stage, "running"),
+            provider=provider,
+        )
+        await remember_generation(request, job.prompt["description"], result)
+        job.emit("postprocessing", "running")
+        return await postprocess_result(result, request.output_format, request_image_size(request))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "jobs": len(self._jobs),
+            "queued": {prefix: queue.qsize() for prefix, queue in self._queues.items()},
+        }
+
+
+job_manager = JobManager(JOB_CONCURRENCY, JOB_PRIORITIES, JOB_RESULT_TTL)
@@ -0,0 +1,170 @@
+# File: backend/core/log.py
+# Logging estruturado (JSON) e não bloqueante: os módulos só põem registos numa fila; uma thread escreve-os.
+
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional
+
+from core.config import LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_QUEUE_SIZE
+
+# Id do pedido atual, herdado pelas tarefas que ele cria (etapas do grafo, single-flight, variantes de um lote).
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Atributos de qualquer LogRecord; tudo o resto veio de `extra=` e vai para o JSON como campo próprio.
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str]) -> Iterator[None]:
+    """Associa os registos emitidos dentro do bloco a `request_id` (ex.: um job retomado por um worker)."""
+    token = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+def should_sample(rate: float) -> bool:
+    """Decide se um registo amostrado é emitido; com `rate` 0 não chega a gerar um número aleatório."""
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    No event loop só se junta a mensagem aos argumentos e se captura o id do pedido; a serialização
+    em JSON e a escrita ficam para a thread do listener. Com a fila cheia, o registo é descartado
+    (e contado) em vez de bloquear o pedido.
+    """
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.request_id = _request_id.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                payload[key] = value
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legível para desenvolvimento local (LOG_FORMAT=text), com os campos extra no fim."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        extras = " ".join(f"{key}={value!r}" for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS)
+        line = f"{timestamp} {record.levelname:<7} [{getattr(record, 'request_id', None) or '-'}] {record.name}: {record.getMessage()}"
+        if extras:
+            line += f" {extras}"
+        if record.exc_text:
+            line += f"\n{record.exc_text}"
+        return line
+
+
+def setup_logging() -> None:
+    """Liga o logger raiz à fila e arranca a thread de escrita. Idempotente."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    log_queue: "queue.Queue" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _handler = NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Escreve os registos ainda na fila e para a thread do listener."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    _listener = _handler = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler else 0
+
+
+class RequestIdMiddleware:
+    """
+    Middleware ASGI: reutiliza o X-Request-ID recebido (se for válido) ou gera um novo, guarda-o
+    no contexto para todos os registos do pedido e devolve-o no cabeçalho da resposta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers", [])).get(REQUEST_ID_HEADER.encode("latin-1"), b"").decode("latin-1")
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with request_context(request_id):
+            await self.app(scope, receive, send_with_request_id)
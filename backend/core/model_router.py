@@ -0,0 +1,251 @@
+# File: backend/core/model_router.py
+# Roteamento entre modelos alternativos com base em latência, circuit breakers e pedidos "hedged".
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import httpx
+import openai
+
+from core.config import (
+    ROUTER_BREAKER_COOLDOWN,
+    ROUTER_BREAKER_ERROR_RATE,
+    ROUTER_BREAKER_MIN_CALLS,
+    ROUTER_HEDGING,
+    ROUTER_HEDGE_MIN_SAMPLES,
+    ROUTER_WINDOW,
+)
+from core.deadline import deadline_expired
+
+logger = logging.getLogger(__name__)
+
+KNOWN_PREFIXES = ("fal-ai", "openai")
+QUALITY_TIERS = ("low", "med", "high")
+MODEL_ID_RE = re.compile(r"^[a-z0-9-]+(/[a-z0-9][a-z0-9._-]*)+$")
+
+
+def validate_model_map(model_map: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> None:
+    """
+    Valida o MODEL_MAP no arranque: ids bem formados (sem segmentos vazios como 'fal-ai//...'),
+    prefixos conhecidos, parâmetros em dicionário e todas as qualidades preenchidas.
+    Levanta ValueError com a lista completa de problemas, para a aplicação não arrancar com um mapa inválido.
+    """
+    problems = []
+    if "free" not in model_map:
+        problems.append("o modo 'free' (fallback) não existe")
+    for mode, tiers in model_map.items():
+        for tier in QUALITY_TIERS:
+            if not tiers.get(tier):
+                problems.append(f"{mode}.{tier}: nenhum modelo configurado")
+        for tier, candidates in tiers.items():
+            if tier not in QUALITY_TIERS:
+                problems.append(f"{mode}.{tier}: qualidade desconhecida")
+            for position, candidate in enumerate(candidates):
+                slot = f"{mode}.{tier}[{position}]"
+                model_id = candidate.get("id", "")
+                if not MODEL_ID_RE.match(model_id):
+                    problems.append(f"{slot}: id de modelo mal formado '{model_id}'")
+                elif model_id.split("/", 1)[0] not in KNOWN_PREFIXES:
+                    problems.append(f"{slot}: prefixo de modelo desconhecido em '{model_id}'")
+                if not isinstance(candidate.get("params", {}), dict):
+                    problems.append(f"{slot}: 'params' deve ser um dicionário")
+    if problems:
+        raise ValueError("MODEL_MAP inválido:\n  - " + "\n  - ".join(problems))
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Falhas do fornecedor (rede, timeout, 429, 5xx) justificam tentar a alternativa; erros do pedido não."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ModelHealth:
+    """Janela deslizante das últimas chamadas de um modelo e o respetivo circuit breaker."""
+
+    def __init__(self, window: int):
+        self.calls: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.opened_at: Optional[float] = None
+        self.half_open = False
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.calls.append((latency, ok))
+
+    def latencies(self) -> List[float]:
+        return sorted(latency for latency, ok in self.calls if ok)
+
+    def error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = self.latencies()
+        return {
+            "calls": len(self.calls),
+            "error_rate": round(self.error_rate(), 4),
+            "p50": round(_percentile(latencies, 0.5), 3) if latencies else None,
+            "p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+            "circuit": "open" if self.opened_at is not None else "closed",
+        }
+
+
+class ModelRouter:
+    """
+    Ordena os candidatos de cada slot (modo, qualidade), ignora os que têm o circuit breaker aberto,
+    faz failover para a alternativa seguinte em falhas do fornecedor e, opcionalmente, lança um
+    pedido "hedged" para a alternativa quando o principal ultrapassa o seu p95.
+    """
+
+    def __init__(self, window: int = ROUTER_WINDOW, error_rate: float = ROUTER_BREAKER_ERROR_RATE,
+                 min_calls: int = ROUTER_BREAKER_MIN_CALLS, cooldown: float = ROUTER_BREAKER_COOLDOWN,
+                 hedging: bool = ROUTER_HEDGING, hedge_min_samples: int = ROUTER_HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.error_rate_threshold = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self._health: Dict[str, ModelHealth] = {}
+        self.stats: Dict[str, int] = {"failovers": 0, "hedges": 0, "hedge_wins": 0, "circuit_opened": 0}
+
+    def health(self, model_id: str) -> ModelHealth:
+        if model_id not in self._health:
+            self._health[model_id] = ModelHealth(self.window)
+        return self._health[model_id]
+
+    def record(self, model_id: str, latency: float, ok: bool) -> None:
+        health = self.health(model_id)
+        health.record(latency, ok)
+        if health.opened_at is not None:
+            if health.half_open:
+                # Resultado do pedido de teste: sucesso fecha o circuito, falha mantém-no aberto.
+                health.half_open = False
+                if ok:
+                    health.opened_at = None
+                    health.calls.clear()
+                else:
+                    health.opened_at = time.monotonic()
+        elif len(health.calls) >= self.min_calls and health.error_rate() >= self.error_rate_threshold:
+            health.opened_at = time.monotonic()
+            self.stats["circuit_opened"] += 1
+            logger.warning("Circuit breaker aberto para o modelo '%s' (taxa de erro %.0f%%).", model_id, health.error_rate() * 100, extra={"model": model_id})
+
+    def _available(self, model_id: str) -> bool:
+        """Só consulta o estado: um circuito aberto volta a estar disponível depois do cooldown, se não houver já um teste em curso."""
+        health = self.health(model_id)
+        if health.opened_at is None:
+            return True
+        return not health.half_open and time.monotonic() - health.opened_at >= self.cooldown
+
+    def _start_probe(self, model_id: str) -> Optional[float]:
+        """
+        Chamado só quando o candidato vai mesmo ser chamado. Depois do cooldown, esta chamada passa a ser
+        o único pedido de teste (half-open) e o cooldown é rearmado, para que no máximo um pedido por janela
+        chegue a um fornecedor ainda suspeito. Devolve o `opened_at` anterior, ou None se não for um teste.
+        """
+        health = self.health(model_id)
+        if health.opened_at is None or not self._available(model_id):
+            return None
+        previous, health.opened_at, health.half_open = health.opened_at, time.monotonic(), True
+        return previous
+
+    def order(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Ordena os candidatos sem alterar o estado dos circuitos (pode ser usado só para consulta)."""
+        available = [c for c in candidates if self._available(c["id"])]
+        # Com todos os circuitos abertos, tenta na mesma o principal em vez de falhar sem tentar.
+        return available or candidates[:1]
+
+    def _hedge_delay(self, model_id: str) -> Optional[float]:
+        latencies = self.health(model_id).latencies()
+        if not self.hedging or len(latencies) < self.hedge_min_samples:
+            return None
+        return _percentile(latencies, 0.95)
+
+    async def _timed(self, candidate: Dict[str, Any], call: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        probe_opened_at = self._start_probe(candidate["id"])
+        start = time.perf_counter()
+        try:
+            result = await call(candidate)
+        except Exception as e:
+            # Um timeout causado pelo prazo do próprio pedido não diz nada sobre a saúde do fornecedor.
+            if is_retryable_error(e) and not deadline_expired():
+                self.record(candidate["id"], time.perf_counter() - start, ok=False)
+            raise
+        else:
+            # Resultados vindos do cache não dizem nada sobre a saúde do fornecedor.
+            if not (isinstance(result, dict) and result.get("cached")):
+                self.record(candidate["id"], time.perf_counter() - start, ok=True)
+            return result
+        finally:
+            health = self.health(candidate["id"])
+            if probe_opened_at is not None and health.half_open:
+                # O teste acabou sem veredicto (cancelado, erro do pedido, cache): o próximo pedido pode testar.
+                health.half_open = False
+                health.opened_at = probe_opened_at
+
+    async def call(self, candidates: List[Dict[str, Any]], call: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        remaining = self.order(candidates)
+        # Modelos já tentados, incluindo as alternativas lançadas como pedido "hedged": não se repetem no failover.
+        tried: Set[str] = set()
+        while remaining:
+            candidate, remaining = remaining[0], remaining[1:]
+            try:
+                return await self._call_with_hedge(candidate, remaining[0] if remaining else None, call, tried)
+            except Exception as e:
+                remaining = [c for c in remaining if c["id"] not in tried]
+                # Sem tempo restante, a alternativa nem chegaria a responder.
+                if not is_retryable_error(e) or not remaining or deadline_expired():
+                    raise
+                self.stats["failovers"] += 1
+                logger.warning("O modelo '%s' falhou (%s). A tentar '%s'.", candidate["id"], e, remaining[0]["id"], extra={"model": candidate["id"]})
+        raise ValueError("Nenhum modelo candidato para o pedido.")
+
+    async def _call_with_hedge(self, primary: Dict[str, Any], alternative: Optional[Dict[str, Any]],
+                               call: Callable[[Dict[str, Any]], Awaitable[Any]], tried: Set[str]) -> Any:
+        tried.add(primary["id"])
+        delay = self._hedge_delay(primary["id"]) if alternative else None
+        if delay is None:
+            return await self._timed(primary, call)
+
+        primary_task = asyncio.ensure_future(self._timed(primary, call))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        self.stats["hedges"] += 1
+        tried.add(alternative["id"])
+        hedge_task = asyncio.ensure_future(self._timed(alternative, call))
+        pending = {primary_task, hedge_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # Ambos falharam: propaga o erro do principal.
+            return primary_task.result()
+        finally:
+            for task in (primary_task, hedge_task):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # marca a exceção do pedido perdedor como lida
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "models": {model_id: h.snapshot() for model_id, h in self._health.items()}}
+
+
+model_router = ModelRouter()
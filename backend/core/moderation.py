@@ -0,0 +1,44 @@
+# File: backend/core/moderation.py
+# Moderação proativa do prompt do utilizador com a API de moderação da OpenAI.
+
+import logging
+from typing import Optional
+from openai import AsyncOpenAI
+from core.clients import client_manager
+from core.config import OPENAI_TIMEOUT
+from core.deadline import remaining_timeout
+from core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Pedidos concorrentes com o mesmo prompt partilham uma única chamada à moderação.
+moderation_flight = SingleFlight("moderation")
+
+
+class PromptFlaggedError(Exception):
+    """O prompt do utilizador foi bloqueado pela moderação."""
+
+
+async def moderate_prompt(text: str, openai_client: Optional[AsyncOpenAI] = None) -> None:
+    """
+    Levanta PromptFlaggedError se o prompt violar as políticas de conteúdo.
+    Se a API de moderação falhar ou não estiver configurada, regista o erro e deixa o
+    processo continuar (fail-open), dependendo das outras camadas de segurança.
+    """
+    client = openai_client or client_manager.openai
+    if not client:
+        return
+
+    await moderation_flight.do(text, lambda: _moderate_with_api(text, client))
+
+
+async def _moderate_with_api(text: str, client: AsyncOpenAI) -> None:
+    try:
+        mod_response = await client.moderations.create(input=text, timeout=remaining_timeout(OPENAI_TIMEOUT))
+    except Exception as e:
+        logger.warning("Erro na API de moderação da OpenAI: %s. A prosseguir com as outras camadas de segurança.", e)
+        return
+
+    if mod_response.results[0].flagged:
+        logger.info("Prompt do utilizador bloqueado pela moderação.", extra={"prompt": text})
+        raise PromptFlaggedError(text)
@@ -0,0 +1,195 @@
+# File: backend/core/pipeline.py
+# Execução das etapas da geração como um pequeno grafo de dependências.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from models.generate import GenerateRequest
+from core.clients import ClientManager, client_manager
+from core.deadline import within_deadline
+from core.moderation import moderate_prompt
+from core.prompt_composer import load_preset, apply_modifiers_and_influence
+from core.translator import translate_prompt_intelligently
+from core.config import SIMILARITY_THRESHOLD
+from core.image_generator import generate_image_from_json, resolve_model_candidates
+from core.metrics import span
+from core.postprocess import postprocess_result
+from core.result_cache import result_cache
+from core.similarity_index import similarity_index, similarity_namespace
+
+
+class StageGraph:
+    """
+    Executa etapas assíncronas em paralelo, respeitando as dependências declaradas.
+    Cada etapa recebe como argumentos nomeados os resultados das etapas de que depende.
+    Se alguma etapa falhar, as restantes são canceladas e a exceção é propagada.
+    Com um prazo no contexto (core.deadline), cada etapa só espera o tempo restante do pedido.
+    `on_stage`, se indicado, é chamado com o nome de cada etapa no momento em que ela arranca.
+    """
+
+    def __init__(self, on_stage: Optional[Callable[[str], None]] = None):
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.on_stage = on_stage
+
+    def add(self, name: str, fn: Callable[..., Awaitable[Any]], deps: Iterable[str] = ()) -> None:
+        deps = tuple(deps)
+        # Exigir que as dependências já existam garante que o grafo não tem ciclos.
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"A etapa '{name}' depende de etapas desconhecidas: {missing}")
+        self._stages[name] = (fn, deps)
+
+    async def run(self) -> Dict[str, Any]:
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str) -> Any:
+            fn, deps = self._stages[name]
+            inputs = {dep: await tasks[dep] for dep in deps}
+            if self.on_stage:
+                self.on_stage(name)
+            # O tempo de cada etapa vai para as métricas e para o cabeçalho Server-Timing (core.metrics).
+            with span(name):
+                return await within_deadline(name, fn(**inputs))
+
+        for name in self._stages:
+            tasks[name] = asyncio.ensure_future(run_stage(name))
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return dict(zip(tasks, results))
+
+
+StageCallback = Callable[[str], None]
+
+
+def add_preparation_stages(graph: StageGraph, request: GenerateRequest, clients: ClientManager, apply_modifiers: bool = True) -> None:
+    """
+    Etapas independentes entre si: moderação, tradução e composição do preset.
+    Com `apply_modifiers=False`, a etapa 'preset' devolve o preset tal como está no registo
+    (usado quando cada variante de um lote escolhe a sua própria influência de estilo).
+    """
+
+    async def moderation():
+        await moderate_prompt(request.user_prompt, openai_client=clients.openai)
+
+    async def translation():
+        return await translate_prompt_intelligently(request.user_prompt, openai_client=clients.openai)
+
+    async def preset():
+        preset_json = load_preset(request.creative_mode, request.context)
+        if not apply_modifiers:
+            return preset_json
+        return apply_modifiers_and_influence(
+            preset_json,
+            request.modifiers,
+            request.creative_mode,
+            request.context
+        )
+
+    graph.add("moderation", moderation)
+    graph.add("translation", translation)
+    graph.add("preset", preset)
+
+
+def request_image_size(request: GenerateRequest) -> Optional[Dict[str, int]]:
+    return request.image_size.model_dump() if request.image_size else None
+
+
+def _similarity_namespace(request: GenerateRequest, model_id: str) -> str:
+    return similarity_namespace(request.creative_mode, request.context, request.modifiers, request.quality,
+                                model_id, request_image_size(request), request.seed)
+
+
+async def find_similar_generation(request: GenerateRequest, translation: str) -> Optional[Dict[str, Any]]:
+    """
+    Procura, entre os modelos do slot, uma geração recente com um prompt quase igual e cuja imagem
+    ainda esteja no cache de resultados. Devolve-a com a semelhança em "similarity", ou None.
+    """
+    threshold = request.similarity_threshold or SIMILARITY_THRESHOLD
+    for candidate in resolve_model_candidates(request.creative_mode, request.quality):
+        match = await similarity_index.find(_similarity_namespace(request, candidate["id"]), translation, threshold)
+        if match is None:
+            continue
+        result_key, score = match
+        cached = await result_cache.get(result_key)
+        if cached is not None:
+            return {**cached, "cached": True, "cache_key": result_key, "similarity": round(score, 3)}
+    return None
+
+
+async def remember_generation(request: GenerateRequest, translation: str, result: Dict[str, Any]) -> None:
+    """Indexa as gerações novas, para poderem ser reutilizadas por pedidos futuros com `reuse_similar`."""
+    if result.get("cached") or "cache_key" not in result:
+        return
+    await similarity_index.add(_similarity_namespace(request, result["model_id"]), translation, result["cache_key"])
+
+
+def compose_final_prompt(preset: Dict[str, Any], translation: str) -> Dict[str, Any]:
+    # Inserir o prompt traduzido no campo 'description' do JSON
+    final_json = preset
+    final_json["description"] = translation
+    return final_json
+
+
+async def prepare_generation(request: GenerateRequest, clients: Optional[ClientManager] = None, on_stage: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """
+    Corre apenas as etapas anteriores à chamada ao fornecedor e devolve o JSON final.
+    Usado quando a geração em si é agendada à parte (fila de jobs).
+    """
+    clients = clients or client_manager
+    graph = StageGraph(on_stage=on_stage)
+    add_preparation_stages(graph, request, clients)
+
+    results = await graph.run()
+    final_json = compose_final_prompt(results["preset"], results["translation"])
+    return {"prompt": final_json}
+
+
+async def run_generation_pipeline(request: GenerateRequest, clients: Optional[ClientManager] = None, on_stage: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """
+    Orquestra as etapas da geração:
+    moderação, tradução e composição do preset correm em paralelo; a geração só arranca
+    depois de a moderação aprovar o prompt. Se a moderação bloquear o prompt, a tradução
+    ainda em curso é cancelada. Com `reuse_similar`, uma geração recente de um prompt quase igual
+    dispensa a chamada ao fornecedor.
+    """
+    clients = clients or client_manager
+    graph = StageGraph(on_stage=on_stage)
+    add_preparation_stages(graph, request, clients)
+
+    async def generation(moderation, translation, preset):
+        final_json = compose_final_prompt(preset, translation)
+        if request.reuse_similar and not request.bypass_cache:
+            with span("similarity"):
+                similar = await find_similar_generation(request, translation)
+            if similar is not None:
+                return final_json, similar
+        result = await generate_image_from_json(
+            prompt_data=final_json,
+            creative_mode=request.creative_mode,
+            quality=request.quality,
+            image_size=request_image_size(request),
+            seed=request.seed,
+            use_cache=not request.bypass_cache,
+            clients=clients,
+            on_progress=on_stage
+        )
+        await remember_generation(request, translation, result)
+        return final_json, result
+
+    async def postprocess(generation):
+        _, result = generation
+        return await postprocess_result(result, request.output_format, request_image_size(request))
+
+    graph.add("generation", generation, deps=("moderation", "translation", "preset"))
+    graph.add("postprocess", postprocess, deps=("generation",))
+
+    results = await graph.run()
+    final_json, _ = results["generation"]
+    return {"prompt": final_json, "result": results["postprocess"]}
@@ -0,0 +1,121 @@
+# File: backend/core/postprocess.py
+# Pós-processamento da imagem gerada: formato de saída, dimensões, remoção de metadados e miniatura.
+
+import asyncio
+import hashlib
+import io
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from core.blob_store import blob_store
+from core.config import POSTPROCESS_THUMBNAIL_SIZE, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_PATH, RESULT_CACHE_TTL
+from core.metrics import span
+from core.process_pool import run_in_process
+from core.result_cache import ResultCache
+
+# Incremente sempre que as definições de codificação mudarem, para invalidar as variantes em cache.
+POSTPROCESS_VERSION = 1
+
+# Formato pedido -> formato do Pillow e opções de codificação.
+OUTPUT_FORMATS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "png": ("PNG", {"compress_level": 6}),
+    "jpeg": ("JPEG", {"quality": 88, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 85, "method": 4}),
+    "avif": ("AVIF", {"quality": 60, "speed": 6}),
+}
+THUMBNAIL_FORMAT = ("WEBP", {"quality": 75, "method": 4})
+
+# Mesmo ficheiro SQLite do cache de resultados (a evicção e os blobs são partilhados),
+# mas com contadores próprios para não misturar as variantes com as gerações.
+variant_cache = ResultCache(RESULT_CACHE_PATH, blob_store, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
+
+
+def _has_metadata(image: Image.Image) -> bool:
+    """EXIF, XMP, comentários ou blocos de texto PNG (ex.: parâmetros da geração)."""
+    if image.getexif():
+        return True
+    return any(
+        key in ("xmp", "XML:com.adobe.xmp", "comment") or isinstance(value, str)
+        for key, value in image.info.items()
+    )
+
+
+def _encode(image: Image.Image, pil_format: str, options: Dict[str, Any]) -> bytes:
+    if pil_format == "JPEG" and image.mode != "RGB":
+        # O JPEG não tem canal alfa: as zonas transparentes ficam brancas.
+        rgba = image.convert("RGBA")
+        flattened = Image.new("RGB", rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.getchannel("A"))
+        image = flattened
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    # Sem `exif`/`pnginfo`, os metadados da origem não são copiados para a nova imagem.
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def process_image(image_data: bytes, output_format: Optional[str], size: Optional[Tuple[int, int]], thumbnail_side: int) -> Dict[str, Any]:
+    """
+    Síncrono e intensivo em CPU (usar via `postprocess_result`). Sem `output_format`, mantém o formato
+    da origem. Quando a origem já está no formato e nas dimensões pedidas e não tem metadados,
+    os bytes originais são devolvidos sem nova codificação (`passthrough`).
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        source_format = (image.format or "").lower()
+        target = output_format or (source_format if source_format in OUTPUT_FORMATS else "png")
+        resize = size is not None and image.size != tuple(size)
+
+        # A orientação EXIF é aplicada antes de os metadados serem descartados.
+        frame = ImageOps.exif_transpose(image)
+        if resize:
+            # Escala até cobrir o tamanho pedido e corta o excesso ao centro.
+            frame = ImageOps.fit(frame, tuple(size), Image.LANCZOS)
+
+        passthrough = target == source_format and not resize and not _has_metadata(image)
+        output = image_data if passthrough else _encode(frame, *OUTPUT_FORMATS[target])
+
+        thumbnail = frame.copy()
+        thumbnail.thumbnail((thumbnail_side, thumbnail_side), Image.LANCZOS)
+        return {
+            "image": output,
+            "thumbnail": _encode(thumbnail, *THUMBNAIL_FORMAT),
+            "width": frame.width,
+            "height": frame.height,
+            "passthrough": passthrough,
+        }
+
+
+def variant_cache_key(source_hash: str, output_format: Optional[str], size: Optional[Tuple[int, int]]) -> str:
+    canonical = json.dumps(
+        {"source": source_hash, "format": output_format, "size": size, "thumbnail": POSTPROCESS_THUMBNAIL_SIZE, "v": POSTPROCESS_VERSION},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def postprocess_result(result: Dict[str, Any], output_format: Optional[str] = None, image_size: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Devolve o resultado da geração com a imagem já no formato/dimensões pedidos e a miniatura em "thumbnail".
+    O trabalho de imagem corre no pool de processos; as variantes ficam em cache por imagem de origem.
+    """
+    source = result["images"][0]
+    size = (image_size["width"], image_size["height"]) if image_size else None
+    key = variant_cache_key(source["hash"], output_format, size)
+
+    cached, cached_thumbnail = await asyncio.gather(variant_cache.get(key), variant_cache.get(f"{key}:thumbnail"))
+    if cached is not None and cached_thumbnail is not None:
+        return {**result, "images": cached["images"], "thumbnail": cached_thumbnail["images"][0]}
+
+    image_data = await asyncio.to_thread(blob_store.read_bytes, source["hash"])
+    with span("transcode"):
+        processed = await run_in_process(process_image, image_data, output_format, size, POSTPROCESS_THUMBNAIL_SIZE)
+
+    image = source if processed["passthrough"] else await blob_store.put_bytes(processed["image"])
+    thumbnail = await blob_store.put_bytes(processed["thumbnail"])
+    await variant_cache.put(key, {"images": [image]})
+    await variant_cache.put(f"{key}:thumbnail", {"images": [thumbnail]})
+    return {**result, "images": [image], "thumbnail": thumbnail}
@@ -0,0 +1,160 @@
+# File: backend/core/preset_registry.py
+# Registo em memória dos presets: indexação no arranque e hot reload baseado em mtime.
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import PRESET_RELOAD_INTERVAL
+from core.image_generator import build_prompt_from_dict
+
+logger = logging.getLogger(__name__)
+
+PRESETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'presets')
+DEFAULT_PRESET_KEY = ("default", "")
+
+
+class FrozenDict(dict):
+    """
+    Dicionário imutável usado para os valores aninhados dos presets.
+    Continua a ser um `dict` (serializa com json.dumps), mas recusa qualquer mutação,
+    para que um pedido não consiga corromper o preset partilhado com os outros.
+    """
+    prompt_fragment: Optional[str] = None
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Os presets são imutáveis; copie o valor antes de o alterar.")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __copy__(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> Dict[str, Any]:
+        return json.loads(json.dumps(self))
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class FrozenList(tuple):
+    """Lista imutável de um preset, com o fragmento de prompt já calculado."""
+    prompt_fragment: Optional[str] = None
+
+
+def normalize_preset_key(creative_mode: str, context: str) -> Tuple[str, str]:
+    """Normaliza o par (modo, contexto) da mesma forma que os nomes dos ficheiros de preset."""
+    mode_key = creative_mode.strip().lower().replace(' ', '-')
+    context_key = context.strip().lower().replace(' ', '_').replace('/', '_')
+    return mode_key, context_key
+
+
+def _key_from_filename(filename: str) -> Tuple[str, str]:
+    stem = filename[:-len(".json")]
+    if stem == "default":
+        return DEFAULT_PRESET_KEY
+    mode_key, _, context_key = stem.partition('_')
+    return mode_key, context_key
+
+
+def _freeze(value: Any) -> Any:
+    """Converte recursivamente o JSON de um preset em estruturas imutáveis com o fragmento pré-calculado."""
+    if isinstance(value, dict):
+        frozen = FrozenDict((k, _freeze(v)) for k, v in value.items())
+        frozen.prompt_fragment = build_prompt_from_dict(value)
+        return frozen
+    if isinstance(value, list):
+        frozen = FrozenList(_freeze(v) for v in value)
+        frozen.prompt_fragment = build_prompt_from_dict(value)
+        return frozen
+    return value
+
+
+def _validate(data: Any, filename: str) -> None:
+    if not isinstance(data, dict):
+        raise ValueError(f"O preset '{filename}' deve ser um objeto JSON.")
+    for key, value in data.items():
+        if not isinstance(value, (str, int, float, bool, list, dict)):
+            raise ValueError(f"O campo '{key}' do preset '{filename}' tem um tipo inválido.")
+    if not isinstance(data.get("negative_prompt", ""), str):
+        raise ValueError(f"O campo 'negative_prompt' do preset '{filename}' deve ser texto.")
+    if not isinstance(data.get("quality_tags", []), list):
+        raise ValueError(f"O campo 'quality_tags' do preset '{filename}' deve ser uma lista.")
+
+
+class PresetRegistry:
+    """
+    Mantém todos os presets validados em memória, indexados pelo par (modo, contexto) normalizado.
+    Os ficheiros são relidos apenas quando o seu mtime muda, no máximo uma vez a cada
+    `reload_interval` segundos.
+    """
+
+    def __init__(self, presets_dir: str = PRESETS_DIR, reload_interval: float = PRESET_RELOAD_INTERVAL):
+        self.presets_dir = presets_dir
+        self.reload_interval = reload_interval
+        self._presets: Dict[Tuple[str, str], FrozenDict] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def load_all(self) -> int:
+        """Lê e valida todos os presets. Devolve o número de presets em memória."""
+        with self._lock:
+            self._reload_changed()
+        return len(self._presets)
+
+    def refresh_if_stale(self) -> None:
+        if time.monotonic() - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_check >= self.reload_interval:
+                self._reload_changed()
+
+    def _reload_changed(self) -> None:
+        presets = dict(self._presets)
+        mtimes = dict(self._mtimes)
+        seen = set()
+
+        with os.scandir(self.presets_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                mtime = entry.stat().st_mtime
+                if mtimes.get(entry.name) == mtime:
+                    continue
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    _validate(data, entry.name)
+                except (OSError, ValueError) as e:
+                    # Mantém a versão anterior (se existir) para não derrubar os pedidos em curso.
+                    logger.warning("Preset '%s' inválido, ignorado. Erro: %s", entry.name, e)
+                    continue
+                presets[_key_from_filename(entry.name)] = _freeze(data)
+                mtimes[entry.name] = mtime
+
+        for filename in set(mtimes) - seen:
+            presets.pop(_key_from_filename(filename), None)
+            del mtimes[filename]
+
+        # Troca atómica: leitores concorrentes veem sempre um índice completo.
+        self._presets = presets
+        self._mtimes = mtimes
+        self._last_check = time.monotonic()
+
+    def get(self, creative_mode: str, context: str) -> Optional[FrozenDict]:
+        self.refresh_if_stale()
+        return self._presets.get(normalize_preset_key(creative_mode, context))
+
+    def get_default(self) -> Optional[FrozenDict]:
+        self.refresh_if_stale()
+        return self._presets.get(DEFAULT_PRESET_KEY)
+
+
+preset_registry = PresetRegistry()
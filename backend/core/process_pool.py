@@ -0,0 +1,33 @@
+# File: backend/core/process_pool.py
+# Pool de processos partilhado para trabalho de CPU (vetorização, processamento de imagem).
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from core.config import PROCESS_POOL_WORKERS
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Cria o pool na primeira utilização, para os processos não arrancarem em workers que nunca o usam."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+    return _executor
+
+
+async def run_in_process(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Corre `fn(*args)` num processo do pool, sem bloquear o event loop nem disputar o GIL.
+    `fn` e os argumentos têm de ser serializáveis (funções ao nível do módulo, bytes, dicts...).
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_process_pool(), fn, *args)
+
+
+def shutdown_process_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
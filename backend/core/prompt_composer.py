@@ -1,10 +1,11 @@
 # File: backend/core/prompt_composer.py
-import json
-import os
+import logging
 import random
 from typing import Dict, Any
 
-PRESETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'presets')
+from core.preset_registry import preset_registry
+
+logger = logging.getLogger(__name__)
 
 # Dicionário de "Ingredientes Secretos" para rotação de estilo
 STYLE_INFLUENCERS = {
@@ -26,26 +27,27 @@ STYLE_INFLUENCERS = {
 }
 
 def load_preset(creative_mode: str, context: str) -> Dict[str, Any]:
-    """Carrega o arquivo JSON do preset com base no modo e contexto."""
-    context_filename_part = context.lower().replace(' ', '_')
-    filename = f"{creative_mode.lower()}_{context_filename_part}.json"
-    
-    filepath = os.path.join(PRESETS_DIR, filename)
+    """
+    Devolve o preset do modo e contexto a partir do registo em memória.
+    O dicionário de topo é uma cópia própria do pedido; os valores aninhados são imutáveis e partilhados.
+    """
+    preset = preset_registry.get(creative_mode, context)
 
-    if not os.path.exists(filepath):
-        default_path = os.path.join(PRESETS_DIR, 'default.json')
-        if not os.path.exists(default_path):
-            raise FileNotFoundError(f"Preset '{filename}' não encontrado e nenhum 'default.json' de fallback foi achado.")
-        filepath = default_path
-        print(f"Aviso: Preset '{filename}' não encontrado. Usando 'default.json'.")
+    if preset is None:
+        preset = preset_registry.get_default()
+        if preset is None:
+            raise FileNotFoundError(f"Preset para '{creative_mode}/{context}' não encontrado e nenhum 'default.json' de fallback foi achado.")
+        logger.warning("Preset para '%s/%s' não encontrado. Usando 'default.json'.", creative_mode, context)
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return dict(preset)
 
 def apply_modifiers_and_influence(preset_data: Dict[str, Any], modifiers: Dict[str, Any], creative_mode: str, context: str) -> Dict[str, Any]:
     """
     Aplica os modificadores da UI e injeta aleatoriamente uma influência de estilo secreta.
+    Devolve um novo dicionário; o preset recebido não é alterado.
     """
+    preset_data = dict(preset_data)
+
     # 1. Aplicar os modificadores do utilizador, se existirem
     if modifiers:
         style_parts = []
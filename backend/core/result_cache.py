@@ -0,0 +1,149 @@
+# File: backend/core/result_cache.py
+# Cache de resultados de geração, endereçado pela chamada final ao fornecedor.
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from core.blob_store import BlobStore, blob_store
+from core.config import RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def generation_cache_key(model_id: str, model_params: Dict[str, Any], prompt: str, negative_prompt: str, seed: Optional[int]) -> str:
+    """Hash canónico (JSON com chaves ordenadas) de tudo o que determina a chamada ao fornecedor."""
+    canonical = json.dumps(
+        {
+            "model_id": model_id,
+            "params": model_params,
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "seed": seed,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Índice SQLite (partilhado entre workers) que associa a chave da chamada ao blob da imagem gerada.
+    As imagens ficam no blob store; quando o tamanho total ultrapassa `max_bytes`, as entradas
+    usadas há mais tempo são removidas (LRU), juntamente com os blobs que deixam de ser referenciados.
+    """
+
+    def __init__(self, path: str, blobs: BlobStore, max_bytes: int, ttl: float):
+        self.path = path
+        self.blobs = blobs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, blob_hash TEXT NOT NULL, size INTEGER NOT NULL, "
+                "metadata TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+            db.execute("CREATE INDEX IF NOT EXISTS results_blob_hash ON results (blob_hash)")
+            self._db = db
+        return self._db
+
+    def _delete_rows(self, db: sqlite3.Connection, keys) -> None:
+        for key, blob_hash in keys:
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            still_used = db.execute("SELECT 1 FROM results WHERE blob_hash = ? LIMIT 1", (blob_hash,)).fetchone()
+            if not still_used:
+                self.blobs.delete(blob_hash)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT blob_hash, metadata, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            blob_hash, metadata, created_at = row
+            # Entradas expiradas ou cujo blob desapareceu do disco contam como falha.
+            if now - created_at >= self.ttl or not self.blobs.exists(blob_hash):
+                self._delete_rows(db, [(key, blob_hash)])
+                return None
+            db.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(metadata)
+
+    def _put(self, key: str, entry: Dict[str, Any]) -> None:
+        now = time.time()
+        image = entry["images"][0]
+        with self._db_lock:
+            db = self._connect()
+            previous = db.execute("SELECT blob_hash FROM results WHERE key = ?", (key,)).fetchone()
+            if previous and previous[0] != image["hash"]:
+                # A nova geração substitui a anterior (ex.: depois de um bypass); o blob antigo pode ficar órfão.
+                self._delete_rows(db, [(key, previous[0])])
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, blob_hash, size, metadata, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, image["hash"], image["size"], json.dumps(entry), now, now),
+            )
+            self._evict(db, now, keep=key)
+
+    def _evict(self, db: sqlite3.Connection, now: float, keep: str) -> None:
+        expired = db.execute("SELECT key, blob_hash FROM results WHERE created_at < ?", (now - self.ttl,)).fetchall()
+        self._delete_rows(db, expired)
+        evicted = len(expired)
+
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT blob_hash, size FROM results)").fetchone()
+        if total > self.max_bytes:
+            for key, blob_hash, size in db.execute(
+                # A entrada acabada de gravar nunca é removida: o seu URL vai ser devolvido agora.
+                "SELECT key, blob_hash, size FROM results WHERE key != ? ORDER BY last_access ASC", (keep,)
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._delete_rows(db, [(key, blob_hash)])
+                if not self.blobs.exists(blob_hash):
+                    total -= size
+                evicted += 1
+        self.stats["evictions"] += evicted
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            logger.warning("Falha ao ler o cache de resultados. Erro: %s", e)
+            entry = None
+        self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    async def put(self, key: str, entry: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self._put, key, entry)
+            self.stats["writes"] += 1
+        except sqlite3.Error as e:
+            logger.warning("Falha ao gravar o cache de resultados. Erro: %s", e)
+
+    def record_bypass(self) -> None:
+        self.stats["bypassed"] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+result_cache = ResultCache(RESULT_CACHE_PATH, blob_store, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
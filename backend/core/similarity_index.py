@@ -0,0 +1,211 @@
+# File: backend/core/similarity_index.py
+# Índice de prompts quase duplicados (MinHash + LSH) para reutilizar gerações recentes.
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import SIMILARITY_INDEX_MAX_ENTRIES, SIMILARITY_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+# 16 bandas de 4 linhas: dois prompts com Jaccard 0.8 partilham pelo menos uma banda com
+# probabilidade > 99.9%; com 0.3, em menos de 13% dos casos (e esses são descartados na verificação).
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+# Incremente sempre que a tokenização ou o MinHash mudarem: as entradas antigas deixam de ser encontradas.
+INDEX_VERSION = 1
+# Máximo de candidatos verificados por pesquisa (os mais recentes primeiro).
+MAX_CANDIDATES = 64
+
+_PRIME = (1 << 61) - 1
+_MASK32 = np.uint64(0xFFFFFFFF)
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+# Palavras sem conteúdo no prompt traduzido (sempre em inglês), ignoradas na comparação.
+_STOPWORDS = frozenset(
+    "a an the of and or with in on at for to from by into onto over under is are be "
+    "this that these those it its very some".split()
+)
+
+
+def _coefficients(name: str) -> np.ndarray:
+    # Derivados de um hash fixo, para serem iguais em todos os workers e versões do NumPy.
+    values = [int.from_bytes(hashlib.blake2b(f"{name}{i}".encode(), digest_size=4).digest(), "big") for i in range(NUM_PERM)]
+    return np.array(values, dtype=np.uint64)
+
+
+# h_i(x) = (a_i * x + b_i) mod p, com x de 32 bits: a_i < 2^31 garante que o produto cabe em 64 bits.
+_A = (_coefficients("a") >> np.uint64(1)) | np.uint64(1)
+_B = _coefficients("b")
+
+
+def tokenize(text: str) -> FrozenSet[str]:
+    """Conjunto de palavras normalizadas: sem pontuação, maiúsculas, acentos combinados nem ordem."""
+    words = _WORD_RE.findall(unicodedata.normalize("NFKC", text).lower())
+    return frozenset(word for word in words if word not in _STOPWORDS)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(tokens: FrozenSet[str]) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens))
+    values = (np.outer(_A, hashes) + _B[:, None]) % np.uint64(_PRIME)
+    return (values & _MASK32).min(axis=1)
+
+
+def band_keys(namespace: str, signature: np.ndarray) -> List[int]:
+    """Uma chave (inteiro de 64 bits com sinal, como o SQLite guarda) por banda da assinatura, dentro do namespace."""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(namespace.encode() + band.to_bytes(1, "big") + rows.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def similarity_namespace(creative_mode: str, context: str, modifiers: Dict[str, Any], quality: str, model_id: str,
+                         image_size: Optional[Dict[str, int]], seed: Optional[int]) -> str:
+    """
+    Tudo o que tem de coincidir exatamente para uma geração poder ser reutilizada: preset (modo e contexto),
+    modificadores, qualidade, modelo, dimensões e seed. Só o prompt traduzido é comparado por semelhança.
+    """
+    canonical = json.dumps(
+        {
+            "v": INDEX_VERSION,
+            "mode": creative_mode.lower().replace(" ", "-"),
+            "context": context,
+            "modifiers": modifiers,
+            "quality": quality.lower(),
+            "model_id": model_id,
+            "image_size": image_size,
+            "seed": seed,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SimilarityIndex:
+    """
+    Índice LSH persistido em SQLite (partilhado entre workers, como os restantes caches): cada entrada
+    guarda as palavras do prompt e a chave do resultado no cache de resultados; a tabela `bands` liga
+    cada banda da assinatura MinHash às entradas. Uma pesquisa é uma única consulta indexada pelas
+    bandas, seguida do Jaccard exato sobre os poucos candidatos, por isso o custo não cresce com o índice.
+    A memória do processo não depende do número de entradas; no disco ficam no máximo `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.stats: Dict[str, int] = {"lookups": 0, "hits": 0, "misses": 0, "inserts": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, tokens TEXT NOT NULL, "
+                "result_key TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS bands (band_key INTEGER NOT NULL, entry_id INTEGER NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS bands_band_key ON bands (band_key)")
+            db.execute("CREATE INDEX IF NOT EXISTS bands_entry_id ON bands (entry_id)")
+            self._db = db
+        return self._db
+
+    def _find(self, namespace: str, tokens: FrozenSet[str], keys: List[int], threshold: float) -> Optional[Tuple[str, float]]:
+        placeholders = ",".join("?" * len(keys))
+        with self._db_lock:
+            rows = self._connect().execute(
+                f"SELECT id, tokens, result_key FROM entries WHERE namespace = ? AND id IN "
+                f"(SELECT entry_id FROM bands WHERE band_key IN ({placeholders})) ORDER BY id DESC LIMIT ?",
+                (namespace, *keys, MAX_CANDIDATES),
+            ).fetchall()
+        best: Optional[Tuple[str, float]] = None
+        for _, stored, result_key in rows:
+            score = jaccard(tokens, frozenset(stored.split(" ")))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (result_key, score)
+        return best
+
+    def _add(self, namespace: str, tokens: FrozenSet[str], keys: List[int], result_key: str) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = db.execute(
+                    "INSERT INTO entries (namespace, tokens, result_key, created_at) VALUES (?, ?, ?, ?)",
+                    (namespace, " ".join(sorted(tokens)), result_key, time.time()),
+                )
+                db.executemany("INSERT INTO bands (band_key, entry_id) VALUES (?, ?)", [(key, cursor.lastrowid) for key in keys])
+                evicted = self._evict(db, cursor.lastrowid)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        self.stats["evictions"] += evicted
+
+    def _evict(self, db: sqlite3.Connection, newest_id: int) -> int:
+        # Os ids são crescentes: tudo o que ficou `max_entries` inserções para trás é o mais antigo.
+        cutoff = newest_id - self.max_entries
+        if cutoff <= 0:
+            return 0
+        deleted = db.execute("DELETE FROM entries WHERE id <= ?", (cutoff,)).rowcount
+        if deleted:
+            db.execute("DELETE FROM bands WHERE entry_id <= ?", (cutoff,))
+        return deleted
+
+    async def find(self, namespace: str, text: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """Devolve (chave do resultado, semelhança) da entrada mais parecida com Jaccard >= `threshold`, ou None."""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        self.stats["lookups"] += 1
+        keys = band_keys(namespace, minhash(tokens))
+        try:
+            match = await asyncio.to_thread(self._find, namespace, tokens, keys, threshold)
+        except sqlite3.Error as e:
+            logger.warning("Falha ao consultar o índice de semelhança. Erro: %s", e)
+            match = None
+        self.stats["hits" if match else "misses"] += 1
+        return match
+
+    async def add(self, namespace: str, text: str, result_key: str) -> None:
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        keys = band_keys(namespace, minhash(tokens))
+        try:
+            await asyncio.to_thread(self._add, namespace, tokens, keys, result_key)
+            self.stats["inserts"] += 1
+        except sqlite3.Error as e:
+            logger.warning("Falha ao gravar no índice de semelhança. Erro: %s", e)
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+similarity_index = SimilarityIndex(SIMILARITY_INDEX_PATH, SIMILARITY_INDEX_MAX_ENTRIES)
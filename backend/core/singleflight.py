@@ -0,0 +1,71 @@
+# File: backend/core/singleflight.py
+# Coalescência ("single-flight") de chamadas idênticas em curso.
+
+import asyncio
+from typing import Any, Callable, Coroutine, Dict
+
+from core.deadline import Deadline, context_with_deadline, current_deadline, shared_deadline
+
+
+class _Call:
+    __slots__ = ("task", "deadline", "waiters")
+
+    def __init__(self, task: asyncio.Task, deadline: Deadline):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Garante que, para a mesma chave, só existe uma chamada ao upstream em curso.
+    O primeiro pedido (líder) cria a tarefa partilhada; os seguintes esperam pelo mesmo resultado.
+    A tarefa é protegida com `asyncio.shield`: se um dos pedidos for cancelado (ex.: o cliente
+    desligou), os outros continuam à espera. Só quando todos desistem é que a chamada é cancelada.
+    A tarefa corre com o prazo mais longo entre os pedidos que esperam por ela (não só o do líder):
+    os timeouts do upstream seguem esse prazo e cada pedido limita a sua própria espera ao seu.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Any, _Call] = {}
+        self.stats: Dict[str, int] = {"leaders": 0, "coalesced": 0, "cancelled": 0}
+
+    async def do(self, key: Any, fn: Callable[[], Coroutine[Any, Any, Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            deadline = shared_deadline(current_deadline())
+            call = _Call(asyncio.get_running_loop().create_task(fn(), context=context_with_deadline(deadline)), deadline)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+            self.stats["leaders"] += 1
+        else:
+            call.deadline.extend_to(current_deadline())
+            self.stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Ninguém espera mais pelo resultado: liberta a chave e cancela a chamada ao upstream.
+                self._forget(key, call)
+                call.task.cancel()
+                self.stats["cancelled"] += 1
+
+    def _forget(self, key: Any, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finish(self, key: Any, call: _Call) -> None:
+        self._forget(key, call)
+        # Marca a exceção como lida, para o asyncio não avisar quando todos os pedidos já desistiram.
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats, "in_flight": len(self._calls)}
@@ -0,0 +1,134 @@
+# File: backend/core/translation_cache.py
+# Cache de traduções em dois níveis: LRU com TTL em memória + SQLite partilhado entre workers.
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza o texto para a chave do cache (Unicode NFC e espaços colapsados). Maiúsculas são preservadas."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TranslationCache:
+    """
+    Guarda traduções já feitas. O nível em memória é consultado primeiro; em caso de falha,
+    consulta-se a base SQLite em disco, que é partilhada por todos os workers do uvicorn.
+    A chave combina o texto normalizado com um `namespace` (modelo + versão da instrução),
+    para que uma mudança de modelo ou de instrução invalide naturalmente as entradas antigas.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 1024, ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "english_skips": 0,
+            "writes": 0,
+        }
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.namespace}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            # WAL permite leituras concorrentes de vários processos enquanto um deles escreve.
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, translation TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def _remember(self, key: str, translation: str, expires_at: float) -> None:
+        self._memory[key] = (translation, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT translation, created_at FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return row[0], row[1]
+
+    def _disk_set(self, key: str, translation: str, created_at: float) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO translations (key, translation, created_at) VALUES (?, ?, ?)",
+                (key, translation, created_at),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                db.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl,))
+
+    async def get(self, text: str) -> Optional[str]:
+        key = self._key(text)
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+            del self._memory[key]
+
+        try:
+            row = await asyncio.to_thread(self._disk_get, key)
+        except sqlite3.Error as e:
+            logger.warning("Falha ao ler o cache de traduções em disco. Erro: %s", e)
+            row = None
+
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+
+        translation, created_at = row
+        self._remember(key, translation, created_at + self.ttl)
+        self.stats["disk_hits"] += 1
+        return translation
+
+    async def set(self, text: str, translation: str) -> None:
+        key = self._key(text)
+        now = time.time()
+        self._remember(key, translation, now + self.ttl)
+        self.stats["writes"] += 1
+        try:
+            await asyncio.to_thread(self._disk_set, key, translation, now)
+        except sqlite3.Error as e:
+            logger.warning("Falha ao gravar o cache de traduções em disco. Erro: %s", e)
+
+    def record_english_skip(self) -> None:
+        self.stats["english_skips"] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """Devolve os contadores atuais e o tamanho do nível em memória."""
+        return {**self.stats, "memory_entries": len(self._memory)}
@@ -1,55 +1,262 @@
 # File: backend/core/translator.py
-import os
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
 from openai import AsyncOpenAI
+from core.clients import client_manager
+from core.config import (
+    OPENAI_TIMEOUT,
+    TRANSLATION_BATCH_MAX_SIZE,
+    TRANSLATION_BATCH_WINDOW_MS,
+    TRANSLATION_BATCHING,
+    TRANSLATION_CACHE_MAX_ENTRIES,
+    TRANSLATION_CACHE_PATH,
+    TRANSLATION_CACHE_TTL,
+)
+from core.deadline import Deadline, context_with_deadline, current_deadline, remaining_timeout, shared_deadline
+from core.translation_cache import TranslationCache, normalize_text
+from core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 # --- INÍCIO DA ATUALIZAÇÃO PARA OPENAI ---
 
-# 1. Inicializa o cliente da OpenAI. Ele irá ler a chave de API
-#    automaticamente da variável de ambiente OPENAI_API_KEY.
-try:
-    client = AsyncOpenAI()
-    # Define o modelo a ser usado. gpt-4o-mini é a escolha mais recente e económica.
-    TRANSLATION_MODEL = "gpt-4.1-nano"
-except Exception as e:
-    print(f"AVISO: Não foi possível inicializar o cliente OpenAI. Verifique a sua OPENAI_API_KEY. Erro: {e}")
-    client = None
+# Define o modelo a ser usado. gpt-4o-mini é a escolha mais recente e económica.
+TRANSLATION_MODEL = "gpt-4.1-nano"
+
+# Incremente sempre que a instrução abaixo mudar, para invalidar as traduções em cache.
+INSTRUCTION_VERSION = 1
+INSTRUCTION = (
+    "Translate the following text to English. IMPORTANT: Do not translate proper names, "
+    "brand names, or words that start with a capital letter, unless they are the first "
+    "word of the sentence. Return ONLY the translated text, nothing else."
+)
+# Variante em lote da mesma instrução: a entrada é um array JSON e a resposta um objeto JSON.
+BATCH_INSTRUCTION = (
+    "Translate each string of the following JSON array to English. IMPORTANT: Do not translate proper names, "
+    "brand names, or words that start with a capital letter, unless they are the first "
+    "word of the sentence. Return ONLY a JSON object of the form {\"translations\": [...]} with exactly "
+    "one translated string per input string, in the same order, nothing else."
+)
+
+translation_cache = TranslationCache(
+    path=TRANSLATION_CACHE_PATH,
+    namespace=f"{TRANSLATION_MODEL}:v{INSTRUCTION_VERSION}",
+    max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+    ttl=TRANSLATION_CACHE_TTL,
+)
+
+# Pedidos concorrentes com o mesmo texto partilham uma única chamada à API.
+translation_flight = SingleFlight("translation")
+
+# Palavras funcionais inequívocas. Palavras que existem em inglês e noutras línguas
+# ("a", "as", "do", "no", "me"...) ficam de fora para não gerar falsos positivos.
+_ENGLISH_WORDS = frozenset(
+    "the an of and with in on for to is are was were be this that these those it its "
+    "at by from into over under about behind between without while which who where "
+    "their his her our your my very some".split()
+)
+_FOREIGN_WORDS = frozenset(
+    # Português
+    "de da do das dos um uma uns umas com para em na nas nos pelo pela pelos pelas "
+    "que não mais muito muita sobre entre sem ao aos à às seu sua isso este esta "
+    # Espanhol
+    "el la los las por y del al una unos unas muy es "
+    # Francês
+    "le les des du et avec dans sur une est "
+    # Alemão e italiano
+    "der das und mit für ein eine ist il gli di della".split()
+)
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def looks_like_english(text: str) -> bool:
+    """
+    Verificação local e barata: só devolve True quando há confiança de que o texto já está em inglês.
+    Na dúvida devolve False e a tradução segue para a API.
+    """
+    if not text.isascii():
+        return False
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return False
+    english_hits = sum(1 for w in words if w in _ENGLISH_WORDS)
+    if english_hits == 0 or any(w in _FOREIGN_WORDS for w in words):
+        return False
+    return english_hits / len(words) >= 0.1
 
 
-async def translate_prompt_intelligently(text: str) -> str:
+async def translate_prompt_intelligently(text: str, openai_client: Optional[AsyncOpenAI] = None) -> str:
     """
     Usa a API da OpenAI com o GPT-4.1-nano para traduzir o texto para o inglês,
     preservando nomes próprios e de marcas.
+    Textos que já estão em inglês e traduções recentes não chegam a chamar a API.
     """
-    if not text or not client:
-        if not client:
-            print("Aviso: Cliente OpenAI não inicializado, retornando prompt original.")
+    if not text:
         return text
 
-    instruction = (
-        "Translate the following text to English. IMPORTANT: Do not translate proper names, "
-        "brand names, or words that start with a capital letter, unless they are the first "
-        "word of the sentence. Return ONLY the translated text, nothing else."
-    )
+    if looks_like_english(text):
+        translation_cache.record_english_skip()
+        return text
+
+    cached = await translation_cache.get(text)
+    if cached is not None:
+        return cached
+
+    # 1. Usa o cliente partilhado da OpenAI, gerido pelo lifespan da aplicação.
+    client = openai_client or client_manager.openai
+    if not client:
+        logger.warning("Cliente OpenAI não inicializado, retornando prompt original.")
+        return text
+
+    translate = translation_batcher.translate if TRANSLATION_BATCHING else _translate_with_api
+    return await translation_flight.do(normalize_text(text), lambda: translate(text, client))
 
+
+async def _translate_with_api(text: str, client: AsyncOpenAI) -> str:
     try:
         # 2. Cria a chamada para a API de Chat Completions
         response = await client.chat.completions.create(
             model=TRANSLATION_MODEL,
             messages=[
-                {"role": "system", "content": instruction},
+                {"role": "system", "content": INSTRUCTION},
                 {"role": "user", "content": text},
             ],
             temperature=0, # Para tradução, queremos a resposta mais direta possível
             max_tokens=200, # Limite generoso para a tradução
+            timeout=remaining_timeout(OPENAI_TIMEOUT),
         )
         
         # 3. Extrai o texto da resposta
         translated_text = response.choices[0].message.content.strip()
-        
-        return translated_text if translated_text else text
+        if not translated_text:
+            return text
+
+        # Só as traduções bem-sucedidas entram no cache; as falhas voltam a tentar a API.
+        await translation_cache.set(text, translated_text)
+        return translated_text
 
     except Exception as e:
-        print(f"Erro na API da OpenAI: {e}. Usando o prompt original.")
+        logger.warning("Erro na API da OpenAI: %s. Usando o prompt original.", e)
         return text
 
+
+class TranslationBatcher:
+    """
+    Junta os textos que chegam dentro de `window` segundos (até `max_size`) numa única chamada
+    ao Chat Completions, que devolve um array JSON de traduções, e entrega cada uma a quem a pediu.
+    Uma resposta mal formada (JSON inválido ou número de itens diferente) faz cair para chamadas
+    individuais; um erro da API devolve o texto original, como na tradução individual.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._pending: Dict[int, Tuple[AsyncOpenAI, List[Tuple[str, asyncio.Future, Optional[Deadline]]]]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self.stats: Dict[str, int] = {"batches": 0, "batched_items": 0, "malformed": 0}
+
+    async def translate(self, text: str, client: AsyncOpenAI) -> str:
+        future = asyncio.get_running_loop().create_future()
+        # Um lote por cliente (na prática, o cliente partilhado do lifespan).
+        key = id(client)
+        _, items = self._pending.setdefault(key, (client, []))
+        items.append((text, future, current_deadline()))
+        if len(items) >= self.max_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: int) -> None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        client, items = self._pending.pop(key, (None, []))
+        # Pedidos cancelados entretanto (ex.: o cliente desligou) já não entram no lote.
+        items = [item for item in items if not item[1].done()]
+        if not items:
+            return
+        # O lote serve vários pedidos: as chamadas usam o prazo mais longo entre eles.
+        deadline = shared_deadline(*(deadline for _, _, deadline in items))
+        task = asyncio.get_running_loop().create_task(
+            self._run(client, [(text, future) for text, future, _ in items]), context=context_with_deadline(deadline)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, client: AsyncOpenAI, items: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in items]
+        try:
+            if len(texts) == 1:
+                results = [await _translate_with_api(texts[0], client)]
+            else:
+                results = await self._translate_batch(texts, client)
+        except asyncio.CancelledError:
+            for _, future in items:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _translate_batch(self, texts: List[str], client: AsyncOpenAI) -> List[str]:
+        self.stats["batches"] += 1
+        self.stats["batched_items"] += len(texts)
+        try:
+            response = await client.chat.completions.create(
+                model=TRANSLATION_MODEL,
+                messages=[
+                    {"role": "system", "content": BATCH_INSTRUCTION},
+                    {"role": "user", "content": json.dumps(texts, ensure_ascii=False)},
+                ],
+                temperature=0,
+                max_tokens=min(200 * len(texts), 4096), # O mesmo limite por texto da chamada individual
+                response_format={"type": "json_object"},
+                timeout=remaining_timeout(OPENAI_TIMEOUT),
+            )
+        except Exception as e:
+            logger.warning("Erro na API da OpenAI (lote de %d traduções): %s. Usando os prompts originais.", len(texts), e)
+            return texts
+
+        translations = _parse_batch_reply(response.choices[0].message.content, len(texts))
+        if translations is None:
+            self.stats["malformed"] += 1
+            logger.warning("Resposta em lote mal formada para %d traduções. A traduzir individualmente.", len(texts))
+            return list(await asyncio.gather(*(_translate_with_api(text, client) for text in texts)))
+
+        results = []
+        for text, translated in zip(texts, translations):
+            translated = translated.strip()
+            if translated:
+                await translation_cache.set(text, translated)
+            results.append(translated or text)
+        return results
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats, "pending": sum(len(items) for _, items in self._pending.values())}
+
+
+def _parse_batch_reply(content: Optional[str], expected: int) -> Optional[List[str]]:
+    """Devolve a lista de traduções, ou None se a resposta não tiver exatamente `expected` strings."""
+    try:
+        payload = json.loads(content or "")
+    except ValueError:
+        return None
+    translations = payload.get("translations") if isinstance(payload, dict) else payload
+    if not isinstance(translations, list) or len(translations) != expected or not all(isinstance(t, str) for t in translations):
+        return None
+    return translations
+
+
+translation_batcher = TranslationBatcher(TRANSLATION_BATCH_WINDOW_MS / 1000, TRANSLATION_BATCH_MAX_SIZE)
+
 # --- FIM DA ATUALIZAÇÃO PARA OPENAI ---
\ No newline at end of file
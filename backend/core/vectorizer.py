@@ -1,33 +1,335 @@
 # Arquivo: core/vectorizer.py
-# Lógica para chamar o modelo de vetorização.
+# Vetorização local de imagens raster (PNG, JPEG, WebP...) para SVG.
+#
+# Etapas: quantização de cores (k-means), remoção de manchas pequenas (regiões conexas),
+# traçado das fronteiras de cada cor em laços fechados, simplificação (RDP) e suavização
+# em curvas de Bézier. Tudo em NumPy e executado no pool de processos, fora do event loop.
 
-import httpx
-from core.config import VECTORIZER_API_KEY
-import base64
+import io
+from typing import Dict, List, Optional, Tuple
 
-async def vectorize_image_data(image_b64_data: bytes) -> str:
+import numpy as np
+from PIL import Image
+
+from core.config import VECTORIZE_CONTEXTS
+from core.preset_registry import normalize_preset_key
+from core.process_pool import run_in_process
+
+# Compromissos qualidade/velocidade. `max_side` limita a resolução de trabalho, `colors` o tamanho
+# da paleta, `min_area` (em píxeis) o tamanho mínimo de uma região, `epsilon` a tolerância do RDP
+# e `curves` ativa a suavização em Bézier (sem ela, o SVG só tem polígonos).
+VECTORIZE_PRESETS: Dict[str, Dict] = {
+    "fast": {"max_side": 256, "colors": 6, "min_area": 12, "epsilon": 1.5, "curves": False, "iterations": 6},
+    "balanced": {"max_side": 512, "colors": 12, "min_area": 24, "epsilon": 1.2, "curves": True, "iterations": 10},
+    "quality": {"max_side": 1024, "colors": 24, "min_area": 32, "epsilon": 1.05, "curves": True, "iterations": 16},
+}
+
+# Abaixo deste ângulo de viragem (em graus), o vértice é suavizado; acima, fica como canto vivo.
+CORNER_ANGLE = 55.0
+# Número de píxeis usados para ajustar o k-means (a atribuição final usa todos).
+KMEANS_SAMPLE = 20000
+ASSIGN_CHUNK = 1 << 18
+
+
+def _load_image(image_data: bytes, max_side: int) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+    """Devolve os píxeis RGB, a máscara de opacidade e as dimensões originais."""
+    with Image.open(io.BytesIO(image_data)) as image:
+        original_size = image.size
+        image = image.convert("RGBA")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        pixels = np.asarray(image)
+    return pixels[..., :3], pixels[..., 3] >= 128, original_size
+
+
+def _kmeans(pixels: np.ndarray, k: int, iterations: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantização por k-means (inicialização k-means++ com seed fixa, para resultados reprodutíveis)."""
+    rng = np.random.default_rng(0)
+    sample = pixels if len(pixels) <= KMEANS_SAMPLE else pixels[rng.choice(len(pixels), KMEANS_SAMPLE, replace=False)]
+
+    unique = np.unique(sample, axis=0)
+    if len(unique) <= k:
+        centers = unique.astype(np.float32)
+    else:
+        centers = np.empty((k, 3), np.float32)
+        centers[0] = sample[rng.integers(len(sample))]
+        closest = ((sample - centers[0]) ** 2).sum(1)
+        for i in range(1, k):
+            centers[i] = sample[rng.choice(len(sample), p=closest / closest.sum())]
+            closest = np.minimum(closest, ((sample - centers[i]) ** 2).sum(1))
+
+        for _ in range(iterations):
+            labels = _nearest(sample, centers)
+            counts = np.bincount(labels, minlength=len(centers))
+            sums = np.stack([np.bincount(labels, sample[:, c], minlength=len(centers)) for c in range(3)], axis=1)
+            filled = counts > 0
+            updated = centers.copy()
+            updated[filled] = sums[filled] / counts[filled, None]
+            if np.allclose(updated, centers, atol=0.5):
+                centers = updated
+                break
+            centers = updated
+
+    labels = np.concatenate([_nearest(pixels[i:i + ASSIGN_CHUNK], centers) for i in range(0, len(pixels), ASSIGN_CHUNK)])
+    return centers, labels
+
+
+def _nearest(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    # ||p - c||² = ||p||² - 2 p·c + ||c||²; o termo ||p||² não muda o argmin.
+    distances = (centers ** 2).sum(1)[None, :] - 2.0 * points @ centers.T
+    return distances.argmin(1)
+
+
+def _label_regions(colors: np.ndarray) -> np.ndarray:
+    """
+    Regiões conexas (vizinhança-4) da mesma cor, por união de raízes com "pointer jumping":
+    cada ronda liga as raízes de vizinhos iguais à menor delas, e o número de rondas cresce
+    com o logaritmo do tamanho das regiões, não com o número de píxeis.
+    """
+    h, w = colors.shape
+    ids = np.arange(h * w).reshape(h, w)
+    right = (colors[:, :-1] == colors[:, 1:]) & (colors[:, :-1] >= 0)
+    down = (colors[:-1, :] == colors[1:, :]) & (colors[:-1, :] >= 0)
+    a = np.concatenate([ids[:, :-1][right], ids[:-1, :][down]])
+    b = np.concatenate([ids[:, 1:][right], ids[1:, :][down]])
+
+    parent = np.arange(h * w)
+    while len(a):
+        root_a, root_b = parent[a], parent[b]
+        differ = root_a != root_b
+        a, b, root_a, root_b = a[differ], b[differ], root_a[differ], root_b[differ]
+        if not len(a):
+            break
+        np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    _, labels = np.unique(parent, return_inverse=True)
+    return labels.reshape(h, w)
+
+
+def _remove_speckles(colors: np.ndarray, min_area: int) -> np.ndarray:
+    """Regiões com menos de `min_area` píxeis são absorvidas pelas cores vizinhas (ou removidas, se isoladas)."""
+    labels = _label_regions(colors)
+    areas = np.bincount(labels.ravel())
+    small = (colors >= 0) & (areas[labels] < min_area)
+    if not small.any():
+        return colors
+
+    colors = colors.copy()
+    colors[small] = -2
+    while True:
+        holes = colors == -2
+        if not holes.any():
+            break
+        filled = colors.copy()
+        padded = np.pad(colors, 1, constant_values=-1)
+        for neighbour in (padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]):
+            take = (filled == -2) & (neighbour >= 0)
+            filled[take] = neighbour[take]
+        if np.array_equal(filled, colors):
+            # Manchas rodeadas apenas de transparência: ruído, ficam transparentes.
+            filled[filled == -2] = -1
+        colors = filled
+    return colors
+
+
+def _trace_loops(mask: np.ndarray) -> List[np.ndarray]:
+    """
+    Fronteira da máscara como laços fechados sobre a grelha de vértices dos píxeis.
+    As arestas são orientadas (região à direita, no referencial da imagem), por isso os contornos
+    exteriores e os buracos têm sentidos opostos e a regra de preenchimento "nonzero" recorta os buracos.
+    """
+    h, w = mask.shape
+    padded = np.pad(mask, 1)
+    stride = w + 1
+
+    above, below = padded[:-1, 1:-1], padded[1:, 1:-1]          # (h+1, w): arestas horizontais
+    left, right = padded[1:-1, :-1], padded[1:-1, 1:]           # (h, w+1): arestas verticais
+    ys, xs = np.nonzero(below & ~above)
+    starts, ends = [ys * stride + xs], [ys * stride + xs + 1]
+    ys, xs = np.nonzero(above & ~below)
+    starts.append(ys * stride + xs + 1); ends.append(ys * stride + xs)
+    ys, xs = np.nonzero(left & ~right)
+    starts.append(ys * stride + xs); ends.append((ys + 1) * stride + xs)
+    ys, xs = np.nonzero(right & ~left)
+    starts.append((ys + 1) * stride + xs); ends.append(ys * stride + xs)
+    starts, ends = np.concatenate(starts), np.concatenate(ends)
+    if not len(starts):
+        return []
+
+    # Cada aresta liga-se a uma que comece no seu vértice final. Nos vértices em "xadrez" há duas
+    # entradas e duas saídas: a k-ésima entrada liga-se à k-ésima saída (qualquer emparelhamento
+    # produz a mesma área preenchida).
+    by_start = np.argsort(starts, kind="stable")
+    first_out = np.searchsorted(starts[by_start], ends)
+    by_end = np.argsort(ends, kind="stable")
+    rank = np.empty(len(ends), np.int64)
+    group_start = np.searchsorted(ends[by_end], ends[by_end])
+    rank[by_end] = np.arange(len(ends)) - group_start
+    following = by_start[first_out + rank].tolist()
+
+    loops = []
+    visited = bytearray(len(following))
+    start_list = starts.tolist()
+    for edge in range(len(following)):
+        if visited[edge]:
+            continue
+        vertices = []
+        while not visited[edge]:
+            visited[edge] = 1
+            vertices.append(start_list[edge])
+            edge = following[edge]
+        vertices = np.array(vertices)
+        points = np.stack([vertices % stride, vertices // stride], axis=1).astype(np.float64)
+        loops.append(_corners(points))
+    return loops
+
+
+def _corners(points: np.ndarray) -> np.ndarray:
+    """Remove os vértices intermédios dos troços retos (só ficam as mudanças de direção)."""
+    direction_in = points - np.roll(points, 1, axis=0)
+    direction_out = np.roll(points, -1, axis=0) - points
+    turns = (direction_in != direction_out).any(axis=1)
+    return points[turns] if turns.any() else points[:1]
+
+
+def _rdp(points: np.ndarray, epsilon: float) -> np.ndarray:
+    """Ramer-Douglas-Peucker num polígono fechado (ancorado no vértice 0 e no mais distante dele)."""
+    n = len(points)
+    if n < 4:
+        return points
+    far = int(np.argmax(((points - points[0]) ** 2).sum(1)))
+    ring = np.concatenate([points, points[:1]])
+    keep = np.zeros(n + 1, bool)
+    keep[[0, far, n]] = True
+    stack = [(0, far), (far, n)]
+    while stack:
+        s, e = stack.pop()
+        if e - s < 2:
+            continue
+        a, b = ring[s], ring[e]
+        segment = ring[s + 1:e]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            distances = np.hypot(*(segment - a).T)
+        else:
+            distances = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        i = int(np.argmax(distances))
+        if distances[i] > epsilon:
+            k = s + 1 + i
+            keep[k] = True
+            stack.append((s, k))
+            stack.append((k, e))
+    return ring[:-1][keep[:-1]]
+
+
+def _fmt(value: float) -> str:
+    text = f"{value:.1f}".rstrip("0").rstrip(".")
+    if text.startswith("0."):
+        text = text[1:]
+    elif text.startswith("-0."):
+        text = "-" + text[2:]
+    return "0" if text in ("", "-0", "-") else text
+
+
+def _join(values) -> str:
+    # Os números negativos dispensam o separador ("1-2"), como é habitual em SVG minificado.
+    return " ".join(_fmt(v) for v in values).replace(" -", "-")
+
+
+def _clamp(vectors: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    length = np.hypot(*vectors.T)[:, None]
+    return vectors * np.minimum(1.0, limit / np.maximum(length, 1e-9))
+
+
+def _loop_path(points: np.ndarray, curves: bool) -> str:
+    """Laço fechado como comandos SVG relativos: `l` para troços retos, `c` para curvas de Bézier."""
+    points = np.round(points, 1)
+    n = len(points)
+    following = np.roll(points, -1, axis=0)
+    if not curves or n < 3:
+        deltas = following[:-1] - points[:-1]
+        return f"M{_join(points[0])}l{_join(deltas.ravel())}z"
+
+    previous = np.roll(points, 1, axis=0)
+    incoming, outgoing = points - previous, following - points
+    cosine = (incoming * outgoing).sum(1) / np.maximum(np.hypot(*incoming.T) * np.hypot(*outgoing.T), 1e-9)
+    corner = cosine < np.cos(np.radians(CORNER_ANGLE))
+
+    # Tangentes de Catmull-Rom nos vértices suaves; nos cantos, pontos de controlo sobre o próprio segmento.
+    # As tangentes são limitadas a um terço do segmento, para troços curtos não criarem laços.
+    after = np.roll(points, -2, axis=0)
+    reach = np.hypot(*outgoing.T)[:, None] / 3.0
+    tangent = _clamp((following - previous) / 6.0, reach)
+    next_tangent = _clamp((after - points) / 6.0, reach)
+    control_1 = np.where(corner[:, None], points + outgoing / 3.0, points + tangent)
+    control_2 = np.where(np.roll(corner, -1)[:, None], following - outgoing / 3.0, following - next_tangent)
+
+    parts = [f"M{_join(points[0])}"]
+    straight = corner & np.roll(corner, -1)
+    for i in range(n):
+        origin = points[i]
+        if straight[i]:
+            if i < n - 1:
+                parts.append("l" + _join(following[i] - origin))
+        else:
+            parts.append("c" + _join(np.concatenate([control_1[i] - origin, control_2[i] - origin, following[i] - origin])))
+    parts.append("z")
+    return "".join(parts)
+
+
+def vectorize_raster(image_data: bytes, preset: str = "balanced") -> str:
+    """Converte a imagem em SVG (síncrono e intensivo em CPU; usar via `vectorize_image_data`)."""
+    settings = VECTORIZE_PRESETS.get(preset)
+    if settings is None:
+        raise ValueError(f"Preset de vetorização desconhecido: '{preset}'.")
+
+    rgb, opaque, (original_width, original_height) = _load_image(image_data, settings["max_side"])
+    h, w = opaque.shape
+    colors = np.full((h, w), -1, np.int32)
+    palette = np.zeros((0, 3), np.float32)
+    if opaque.any():
+        palette, assigned = _kmeans(rgb[opaque].astype(np.float32), settings["colors"], settings["iterations"])
+        colors[opaque] = assigned
+        colors = _remove_speckles(colors, settings["min_area"])
+
+    areas = np.bincount(colors[colors >= 0].ravel(), minlength=len(palette))
+    order = [int(c) for c in np.argsort(-areas) if areas[c] > 0]
+    hex_colors = ["#%02x%02x%02x" % tuple(int(round(v)) for v in np.clip(color, 0, 255)) for color in palette]
+
+    elements = []
+    if order and not (colors == -1).any():
+        # Imagem sem transparência: a cor dominante vira o fundo e as restantes pintam-se por cima,
+        # o que evita frestas de anti-aliasing entre o fundo e as formas e poupa um caminho enorme.
+        elements.append(f'<rect width="{w}" height="{h}" fill="{hex_colors[order[0]]}"/>')
+        order = order[1:]
+    for color in order:
+        loops = [_rdp(loop, settings["epsilon"]) for loop in _trace_loops(colors == color)]
+        d = "".join(_loop_path(loop, settings["curves"]) for loop in loops if len(loop) >= 3)
+        if d:
+            elements.append(f'<path fill="{hex_colors[color]}" d="{d}"/>')
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {w} {h}" '
+        f'width="{original_width}" height="{original_height}">{"".join(elements)}</svg>'
+    )
+
+
+def wants_vectorization(creative_mode: str, context: str, requested: Optional[bool]) -> bool:
+    """Sem indicação explícita do pedido, vetoriza apenas os presets de VECTORIZE_CONTEXTS (logótipos, ícones)."""
+    if requested is not None:
+        return requested
+    return normalize_preset_key(creative_mode, context) in VECTORIZE_CONTEXTS
+
+
+async def vectorize_image_data(image_data: bytes, preset: str = "balanced") -> str:
     """
-    Envia dados de imagem para uma API de vetorização e retorna o conteúdo SVG.
+    Vetoriza os bytes da imagem (PNG com fundo transparente do gpt-image-1, ou as saídas da Fal.ai)
+    e devolve o SVG. Corre num processo do pool, por isso não bloqueia o event loop.
     """
-    if not VECTORIZER_API_KEY:
-        raise ValueError("VECTORIZER_API_KEY não foi configurada no .env")
-
-    # --- LÓGICA DE PLACEHOLDER ---
-    # No futuro, substitua isso pela chamada real à API de vetorização.
-    print("Vetorizando imagem...")
-    # Simula uma resposta SVG
-    decoded_data = base64.b64decode(image_b64_data).decode('utf-8', errors='ignore')
-    text = "SVG Placeholder"
-    try:
-        text = decoded_data.split('text=')[1].replace('+', ' ')
-    except:
-        pass
-
-    svg_content = f'''<svg width="500" height="500" xmlns="http://www.w3.org/2000/svg">
-    <rect width="100%" height="100%" fill="lightgray"/>
-    <text x="50%" y="50%" font-family="Arial" font-size="20" fill="black" text-anchor="middle" dy=".3em">
-        Vetorizado: {text}
-    </text>
-</svg>'''
-    return svg_content
-    # --- FIM DO PLACEHOLDER ---
+    return await run_in_process(vectorize_raster, image_data, preset)
@@ -8,14 +8,58 @@ from dotenv import load_dotenv
 load_dotenv()
 # --- FIM DA CORREÇÃO ---
 
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from api.v1.router import api_router
 from fastapi.middleware.cors import CORSMiddleware
+from core.preset_registry import preset_registry
+from core.clients import client_manager
+from core.config import CLIENT_WARMUP
+from core.jobs import job_manager
+from core.image_generator import MODEL_MAP
+from core.model_router import validate_model_map
+from core.metrics import MetricsMiddleware, registry
+from core.process_pool import shutdown_process_pool
+from core.log import RequestIdMiddleware, setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepara os recursos partilhados no arranque e liberta-os no encerramento."""
+    # Registos em JSON, escritos por uma thread própria para não bloquear o event loop.
+    setup_logging()
+
+    # Um id de modelo mal formado impede o arranque, em vez de falhar pedido a pedido.
+    validate_model_map(MODEL_MAP)
+
+    # Indexa e valida todos os presets uma única vez, fora do caminho dos pedidos.
+    count = preset_registry.load_all()
+    logger.info("%d presets carregados em memória.", count)
+
+    # Um único pool de ligações (HTTP/2, keep-alive) partilhado por todos os pedidos.
+    await client_manager.start(warmup=CLIENT_WARMUP)
+    app.state.clients = client_manager
+
+    # Workers da fila de jobs, com concorrência por prefixo de modelo.
+    await job_manager.start(client_manager)
+    try:
+        yield
+    finally:
+        await job_manager.stop()
+        await client_manager.aclose()
+        shutdown_process_pool()
+        shutdown_logging()
+
 
 app = FastAPI(
     title="Mode V1 Backend",
     description="Backend para geração de imagens com IA.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuração do CORS para permitir requisições do frontend
@@ -27,11 +71,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Histogramas por pedido/etapa e cabeçalho Server-Timing.
+app.add_middleware(MetricsMiddleware)
+
+# Id de correlação (X-Request-ID) de todos os registos do pedido; o mais externo, para cobrir os restantes.
+app.add_middleware(RequestIdMiddleware)
+
 
 @app.get("/", tags=["Health Check"])
 def read_root():
     """Verifica se o servidor está a funcionar."""
     return {"status": "ok"}
 
+@app.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+def read_metrics():
+    """Métricas do processo no formato de texto do Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Inclui as rotas da API da v1
 app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
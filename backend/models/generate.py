@@ -1,6 +1,16 @@
 # File: backend/models/generate.py
-from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, Any, List, Literal, Optional, get_args
+
+# Qualidades com modelos no MODEL_MAP (core.image_generator); qualquer outra é recusada com 422.
+Quality = Literal["low", "med", "high"]
+QUALITIES = get_args(Quality)
+
+def normalize_quality(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+# Máximo de variantes por lote (também usado para validar o orçamento do controlo de admissão).
+BATCH_MAX_COUNT = 8
 
 class ImageSize(BaseModel):
     width: int
@@ -11,11 +21,63 @@ class GenerateRequest(BaseModel):
     context: str = Field(..., description="O contexto dentro do modo, ex: 'Studio Photography'")
     user_prompt: str = Field(..., description="O prompt de texto fornecido pelo usuário.")
     modifiers: Dict[str, Any] = Field({}, description="Opções do AI Assistant, como Style, Mood, etc.")
-    quality: str = Field(..., description="O nível de qualidade selecionado, ex: 'low', 'med', 'high'")
+    quality: Quality = Field(..., description="O nível de qualidade selecionado: 'low', 'med' ou 'high'.")
     image_size: Optional[ImageSize] = Field(None, description="Dimensões da imagem (largura e altura) vindas da UI.")
-    output_format: str = Field("png", description="Formato da imagem de saída.")
+    output_format: Optional[Literal["png", "jpeg", "webp", "avif"]] = Field(None, description="Formato da imagem de saída. Sem valor, mantém o formato devolvido pelo modelo.")
+    seed: Optional[int] = Field(None, description="Seed opcional para resultados reprodutíveis (modelos da Fal.ai).")
+    bypass_cache: bool = Field(False, description="Ignora o cache de resultados e força uma geração nova (ex.: para variar a influência de estilo).")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="Tempo máximo (em segundos) que o cliente está disposto a esperar. Limitado pelo máximo do servidor para a qualidade pedida.")
+    reuse_similar: bool = Field(False, description="Aceita uma geração recente com um prompt quase igual (mesmo preset, modificadores e modelo) em vez de gerar uma nova.")
+    similarity_threshold: Optional[float] = Field(None, ge=0.5, le=1.0, description="Semelhança mínima (0.5 a 1) para reutilizar com `reuse_similar`. Sem valor, usa o limiar do servidor.")
+    delivery: Literal["url", "inline"] = Field("url", description="'url' devolve um link para /api/v1/images/{hash}; 'inline' devolve a imagem embutida em base64 (data URL).")
+    vectorize: Optional[bool] = Field(None, description="Devolve também a imagem vetorizada em SVG. Sem valor, só os presets de logótipo e ícones são vetorizados.")
+    vectorize_preset: Literal["fast", "balanced", "quality"] = Field("balanced", description="Compromisso velocidade/fidelidade da vetorização.")
+
+    @field_validator("output_format", mode="before")
+    @classmethod
+    def normalize_output_format(cls, value):
+        if isinstance(value, str):
+            value = value.strip().lower()
+            return "jpeg" if value == "jpg" else value
+        return value
+
+    @field_validator("quality", mode="before")
+    @classmethod
+    def normalize_quality(cls, value):
+        return normalize_quality(value)
+
+class BatchGenerateRequest(GenerateRequest):
+    count: int = Field(4, ge=1, le=BATCH_MAX_COUNT, description="Número de variantes a gerar.")
+    seeds: Optional[List[int]] = Field(None, description="Seeds explícitas por variante (usadas em ciclo). Sem elas, usa seed + índice ou seeds aleatórias.")
+    qualities: Optional[List[Quality]] = Field(None, description="Qualidades por variante (usadas em ciclo), ex: ['low', 'high']. Sem elas, usa 'quality'.")
+    vary_influence: bool = Field(True, description="Cada variante sorteia a sua própria influência de estilo.")
+
+    @field_validator("qualities", mode="before")
+    @classmethod
+    def normalize_qualities(cls, value):
+        return [normalize_quality(item) for item in value] if isinstance(value, list) else value
 
 class GenerateResponse(BaseModel):
-    image_data: str = Field(..., description="Os dados da imagem gerada em formato base64 (data:image/png;base64,...).")
+    image_url: str = Field(..., description="URL da imagem gerada (/api/v1/images/{hash}) ou, no modo 'inline', a data URL em base64.")
     prompt_used: str = Field(..., description="O prompt final (em formato JSON) que foi usado para a geração.")
-    seed: Optional[int] = Field(None, description="A seed usada para a geração.")
\ No newline at end of file
+    seed: Optional[int] = Field(None, description="A seed usada para a geração.")
+    thumbnail_url: Optional[str] = Field(None, description="URL (ou data URL, no modo 'inline') de uma miniatura para pré-visualização.")
+    svg: Optional[str] = Field(None, description="A imagem vetorizada (SVG), quando a vetorização foi pedida.")
+    similarity: Optional[float] = Field(None, description="Quando a imagem foi reutilizada de um prompt quase igual (`reuse_similar`), a semelhança entre os dois.")
+class JobResponse(BaseModel):
+    job_id: str = Field(..., description="Identificador do job de geração.")
+    status: str = Field(..., description="Estado do job: pending, preparing, queued, running, completed ou failed.")
+    stage: Optional[str] = Field(None, description="Última etapa reportada (moderation, translation, queued, running, downloading...).")
+    result: Optional[GenerateResponse] = Field(None, description="O resultado da geração, quando o job termina com sucesso.")
+    error: Optional[str] = Field(None, description="Mensagem de erro, quando o job falha.")
+    created_at: float = Field(..., description="Momento da submissão (epoch, em segundos).")
+    updated_at: float = Field(..., description="Momento da última transição de etapa (epoch, em segundos).")
+
+class BatchVariantResponse(BaseModel):
+    index: int = Field(..., description="Posição da variante no lote.")
+    quality: str = Field(..., description="Qualidade usada nesta variante.")
+    seed: Optional[int] = Field(None, description="A seed usada para a geração.")
+    image_url: Optional[str] = Field(None, description="URL da imagem gerada (ou data URL no modo 'inline').")
+    thumbnail_url: Optional[str] = Field(None, description="URL da miniatura de pré-visualização.")
+    prompt_used: Optional[str] = Field(None, description="O prompt final (em formato JSON) usado nesta variante.")
+    error: Optional[str] = Field(None, description="Mensagem de erro, se esta variante falhou.")